@@ -165,12 +165,13 @@ def save_tokens(tokens: dict, client_id: str, client_secret: str) -> Path:
 
     # Calculate expiration time
     expires_in = tokens.get('expires_in', 3600)
-    expires_at = (datetime.now() + timedelta(seconds=expires_in)).isoformat()
+    expires_dt = datetime.now() + timedelta(seconds=expires_in)
 
     token_data = {
         'access_token': tokens['access_token'],
         'refresh_token': tokens['refresh_token'],
-        'expires_at': expires_at,
+        'expires_at': expires_dt.isoformat(),
+        'expires_at_epoch': expires_dt.timestamp(),
         'client_id': client_id,
         'client_secret': client_secret,
         'scopes': SCOPES,
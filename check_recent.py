@@ -3,8 +3,13 @@
 
 from datetime import datetime, timedelta
 
-from config import PAYMENT_HISTORY_FILE, PROCESSED_PHOTOS_FILE, PROCESSED_EMAILS_FILE
-from storage import load_json
+from config import (
+    PAYMENT_HISTORY_FILE,
+    PROCESSED_PHOTOS_FILE,
+    PROCESSED_PHOTOS_LOG_FILE,
+    PROCESSED_EMAILS_FILE,
+)
+from storage import load_json, load_lines
 
 LOG_FILE = PAYMENT_HISTORY_FILE.parent / 'payme.log'
 
@@ -15,8 +20,10 @@ def main():
     print('=' * 60)
 
     print('\n=== PROCESSED PHOTOS ===')
-    data = load_json(PROCESSED_PHOTOS_FILE, {})
-    processed = data.get('processed', [])
+    processed = load_lines(PROCESSED_PHOTOS_LOG_FILE)
+    if not processed:
+        # Not yet migrated from the legacy JSON list
+        processed = load_json(PROCESSED_PHOTOS_FILE, {}).get('processed', [])
     print('Total processed:', len(processed))
     print('Last 10:')
     for pid in processed[-10:]:
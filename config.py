@@ -13,12 +13,14 @@ SCRIPTS_PATH = HA_CONFIG_PATH / 'scripts' / 'payme'
 # Storage files
 GOOGLE_TOKENS_FILE = STORAGE_PATH / 'google_tokens.json'
 ALBUM_CACHE_FILE = STORAGE_PATH / 'album_cache.json'
-PROCESSED_PHOTOS_FILE = STORAGE_PATH / 'processed_photos.json'
+PROCESSED_PHOTOS_FILE = STORAGE_PATH / 'processed_photos.json'  # Legacy, migrated to log
+PROCESSED_PHOTOS_LOG_FILE = STORAGE_PATH / 'processed_photos.txt'  # One photo ID per line
 PROCESSED_EMAILS_FILE = STORAGE_PATH / 'processed_emails.json'
 PAYMENT_HASHES_FILE = STORAGE_PATH / 'payment_hashes.json'
 PAYMENT_HISTORY_FILE = STORAGE_PATH / 'payment_history.json'
 BIC_DB_FILE = STORAGE_PATH / 'bic_db.json'
 BIC_CACHE_FILE = STORAGE_PATH / 'bic_cache.json'
+OCR_CACHE_FILE = STORAGE_PATH / 'ocr_cache.json'  # Gemini responses by content hash
 
 # Gmail settings
 GMAIL_LABEL = 'bill-pay-HA'  # Label to filter emails for processing
@@ -32,6 +34,16 @@ WISE_API_DELAY_SECONDS = 2
 HTTP_TIMEOUT_SECONDS = 30
 HTTP_RETRY_ATTEMPTS = 3
 CONFIDENCE_THRESHOLD = 0.9
+OCR_CACHE_MAX_ENTRIES = 500  # Oldest cached Gemini responses are dropped beyond this
+POLL_GROUP_WORKERS = 4  # Photo groups processed concurrently; keep low for Gemini rate limits
+TRANSFER_CHECK_WORKERS = 8  # Wise transfers fetched concurrently by check-transfers
+PHOTO_DOWNLOAD_WORKERS = 4  # Pages of one bill downloaded concurrently (per photo group)
+
+# Google Photos page sizes, both the API maximum - do not lower
+# (https://developers.google.com/photos/library/reference/rest/v1/albums/list,
+#  https://developers.google.com/photos/library/reference/rest/v1/mediaItems/search)
+GOOGLE_PHOTOS_ALBUM_PAGE_SIZE = 50
+GOOGLE_PHOTOS_MEDIA_PAGE_SIZE = 100
 
 # API endpoints
 WISE_API_BASE = 'https://api.wise.com'
@@ -102,11 +114,12 @@ def print_config() -> None:
     for name, path in [
         ('Google tokens', GOOGLE_TOKENS_FILE),
         ('Album cache', ALBUM_CACHE_FILE),
-        ('Processed photos', PROCESSED_PHOTOS_FILE),
+        ('Processed photos', PROCESSED_PHOTOS_LOG_FILE),
         ('Payment hashes', PAYMENT_HASHES_FILE),
         ('Payment history', PAYMENT_HISTORY_FILE),
         ('BIC database', BIC_DB_FILE),
         ('BIC cache', BIC_CACHE_FILE),
+        ('OCR cache', OCR_CACHE_FILE),
     ]:
         exists = '✓' if path.exists() else '✗'
         print(f'  {exists} {name}: {path}')
@@ -6,8 +6,11 @@ Run this when bills aren't showing up or the system isn't working.
 
 import json
 import os
+import re
 import subprocess
 import sys
+from collections import Counter
+from itertools import chain
 from pathlib import Path
 
 STORAGE_PATH = Path('/config/.storage/payme')
@@ -17,6 +20,19 @@ SCRIPTS_PATH = Path('/config/scripts/payme')
 
 VALID_CURRENCIES = ('EUR', 'USD', 'GBP', 'CHF', '')
 
+# Environment variable -> secrets.yaml key
+REQUIRED_SECRETS = {
+    'PAYME_GEMINI_API_KEY': 'payme_gemini_api_key',
+    'PAYME_WISE_API_TOKEN': 'payme_wise_api_token',
+    'PAYME_WISE_PROFILE_ID': 'payme_wise_profile_id',
+}
+
+# One anchored pattern per secret key, so commented-out lines never match
+_SECRET_KEY_RES = {
+    key: re.compile(rf'^[ \t]*{re.escape(key)}[ \t]*:(.*)$', re.M)
+    for key in REQUIRED_SECRETS.values()
+}
+
 
 def print_header(text):
     print()
@@ -42,14 +58,18 @@ def print_fix(text):
 
 
 def load_json(path):
-    if path.exists():
+    try:
         return json.loads(path.read_text())
-    return {}
+    except FileNotFoundError:
+        return {}
 
 
 def save_json(path, data):
+    # Write a sibling temp file and rename it over, so a crash never leaves half a file
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(data, indent=2))
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(json.dumps(data, indent=2) + '\n')
+    os.replace(tmp, path)
 
 
 def check_dependencies():
@@ -87,29 +107,23 @@ def check_env_vars():
     """Check and set environment variables from secrets.yaml."""
     print_header('2. CHECKING ENVIRONMENT VARIABLES')
 
-    required = {
-        'PAYME_GEMINI_API_KEY': 'payme_gemini_api_key',
-        'PAYME_WISE_API_TOKEN': 'payme_wise_api_token',
-        'PAYME_WISE_PROFILE_ID': 'payme_wise_profile_id',
-    }
-
-    # Load secrets
+    # Load only the secrets we need; the rest of the file is never split
     secrets = {}
-    if SECRETS_FILE.exists():
-        for line in SECRETS_FILE.read_text().splitlines():
-            if ':' in line and not line.strip().startswith('#'):
-                key, _, value = line.partition(':')
-                key = key.strip()
-                value = value.strip().strip('"').strip("'")
-                secrets[key] = value
-        print_ok(f'Loaded {len(secrets)} secrets from {SECRETS_FILE}')
-    else:
+    try:
+        content = SECRETS_FILE.read_text()
+    except FileNotFoundError:
         print_fail(f'Secrets file not found: {SECRETS_FILE}')
         return False
 
+    for key, pattern in _SECRET_KEY_RES.items():
+        match = pattern.search(content)
+        if match:
+            secrets[key] = match.group(1).strip().strip('"').strip("'")
+    print_ok(f'Loaded {len(secrets)} secrets from {SECRETS_FILE}')
+
     # Set environment variables
     all_set = True
-    for env_var, secret_key in required.items():
+    for env_var, secret_key in REQUIRED_SECRETS.items():
         if secret_key in secrets:
             os.environ[env_var] = secrets[secret_key]
             masked = secrets[secret_key][:4] + '***'
@@ -128,11 +142,25 @@ def check_invalid_currencies():
     data = load_json(HISTORY_FILE)
     fixed = 0
 
-    for collection in ['pending', 'history']:
-        for bill in data.get(collection, []):
-            currency = bill.get('currency', '')
-            if currency and currency not in VALID_CURRENCIES:
-                print_fail(f"Invalid currency '{currency}' in bill {bill.get('id')}")
+    invalid = [
+        (collection, bill)
+        for collection in ('pending', 'history')
+        for bill in data.get(collection, [])
+        if (c := bill.get('currency')) and c not in VALID_CURRENCIES
+    ]
+
+    if invalid:
+        print_fail(f'Found {len(invalid)} invalid-currency bills:')
+        for collection, bill in invalid[:10]:
+            print(f"    [{collection}] {bill.get('id')}: '{bill.get('currency')}' "
+                  f"{bill.get('amount')} - {bill.get('recipient', '')[:40]}")
+        if len(invalid) > 10:
+            print(f'    ... and {len(invalid) - 10} more')
+
+        response = input('Fix all to EUR? [Y/n/i=individual]: ').strip().lower()
+        if response == 'i':
+            for _, bill in invalid:
+                print_fail(f"Invalid currency '{bill.get('currency')}' in bill {bill.get('id')}")
                 print(f"    Recipient: {bill.get('recipient', '')[:40]}")
                 print(f"    Amount: {bill.get('amount')}")
 
@@ -141,11 +169,16 @@ def check_invalid_currencies():
                     bill['currency'] = 'EUR'
                     fixed += 1
                     print_fix('Changed to EUR')
+        elif response != 'n':
+            for _, bill in invalid:
+                bill['currency'] = 'EUR'
+            fixed = len(invalid)
+            print_fix(f'Changed {fixed} bill(s) to EUR')
 
     if fixed > 0:
         save_json(HISTORY_FILE, data)
         print_fix(f'Saved {fixed} fix(es) to {HISTORY_FILE}')
-    else:
+    elif not invalid:
         print_ok('No invalid currencies found')
 
     return fixed
@@ -160,10 +193,7 @@ def check_bill_counts():
     history = data.get('history', [])
 
     # Count by status
-    status_counts = {}
-    for bill in pending + history:
-        status = bill.get('status', 'unknown')
-        status_counts[status] = status_counts.get(status, 0) + 1
+    status_counts = Counter(b.get('status', 'unknown') for b in chain(pending, history))
 
     print(f'Pending array: {len(pending)} bills')
     print(f'History array: {len(history)} bills')
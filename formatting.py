@@ -93,9 +93,7 @@ def format_iban(iban: str) -> str:
 
 def truncate(text: str, max_length: int = 50) -> str:
     """Truncate text with ellipsis if too long."""
-    if len(text) <= max_length:
-        return text
-    return text[:max_length - 3] + '...'
+    return text if len(text) <= max_length else f'{text[:max_length - 3]}...'
 
 
 def format_confidence(score: float) -> str:
@@ -2,18 +2,32 @@
 """Gemini OCR and bill parsing for payme."""
 
 import base64
+import hashlib
 import json
 import re
+import threading
 from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
-from typing import Optional
-
-from config import GEMINI_API_BASE, CONFIDENCE_THRESHOLD, get_env
+from typing import Iterable, Optional
+
+from config import (
+    GEMINI_API_BASE,
+    CONFIDENCE_THRESHOLD,
+    OCR_CACHE_FILE,
+    OCR_CACHE_MAX_ENTRIES,
+    get_env,
+)
 from http_client import post_json, HttpError
+from storage import load_json, save_json
 
 # Gemini model for vision tasks
 GEMINI_MODEL = 'gemini-2.0-flash'
 
+# Gemini responses by content hash (see parse_bill_images_bytes)
+_OCR_CACHE: Optional[dict] = None
+_OCR_CACHE_LOCK = threading.Lock()
+
 # Prompt for bill parsing
 BILL_PARSE_PROMPT = '''Analyze this bill/invoice document and extract the payment details.
 
@@ -125,6 +139,7 @@ class ParsedBill:
     confidence: dict = field(default_factory=dict)
     overall_confidence: float = 0.0
     raw_response: str = ''
+    cache_key: str = ''  # OCR cache entry this parse came from (see evict_cached_responses)
 
     def to_dict(self) -> dict:
         """Convert to dictionary."""
@@ -454,6 +469,105 @@ def parse_bill_bytes(
     return parse_gemini_response(response_text)
 
 
+def _ocr_cache() -> dict:
+    """Cached Gemini responses by content hash, loaded once per process."""
+    global _OCR_CACHE
+    if _OCR_CACHE is None:
+        _OCR_CACHE = load_json(OCR_CACHE_FILE, {})
+    return _OCR_CACHE
+
+
+def _ocr_cache_key(prompt: str, files: list[tuple[bytes, str]]) -> str:
+    """SHA-256 over model, prompt and every page (type and bytes)."""
+    digest = hashlib.sha256(f'{GEMINI_MODEL}\0{prompt}'.encode('utf-8'))
+    for data, mime_type in files:
+        digest.update(f'\0{mime_type}\0{len(data)}\0'.encode('utf-8'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _get_cached_response(key: str) -> Optional[str]:
+    """Cached Gemini response text for this content, or None."""
+    with _OCR_CACHE_LOCK:
+        entry = _ocr_cache().get(key)
+    return entry['response'] if entry else None
+
+
+def _cache_response(key: str, response_text: str) -> None:
+    """Store a Gemini response, dropping the oldest beyond OCR_CACHE_MAX_ENTRIES."""
+    with _OCR_CACHE_LOCK:
+        cache = _ocr_cache()
+        cache[key] = {
+            'response': response_text,
+            'cached_at': datetime.now().isoformat(),
+        }
+        while len(cache) > OCR_CACHE_MAX_ENTRIES:
+            del cache[next(iter(cache))]
+        save_json(OCR_CACHE_FILE, cache)
+
+
+def evict_cached_responses(keys: Iterable[str]) -> int:
+    """
+    Drop cached Gemini responses so those pages are parsed afresh.
+
+    Used when bills are reprocessed after a misparse. Returns number removed.
+    """
+    with _OCR_CACHE_LOCK:
+        cache = _ocr_cache()
+        removed = [key for key in set(keys) if cache.pop(key, None) is not None]
+        if removed:
+            save_json(OCR_CACHE_FILE, cache)
+    return len(removed)
+
+
+def parse_bill_images_bytes(
+    files: list[tuple[bytes, str]],
+    api_key: str = None,
+) -> ParsedBill:
+    """
+    Parse a bill from in-memory pages (no temp files needed).
+
+    Responses are cached by content hash, so the same pages are never
+    sent to Gemini twice (e.g. after a retried or re-run poll).
+
+    Args:
+        files: List of (image_bytes, mime_type) tuples, in page order
+        api_key: Optional API key
+
+    Returns:
+        ParsedBill with extracted data from all pages
+    """
+    if not files:
+        raise ValueError('No images provided')
+
+    prompt = BILL_PARSE_PROMPT if len(files) == 1 else MULTI_PAGE_PROMPT
+    key = _ocr_cache_key(prompt, files)
+
+    cached = _get_cached_response(key)
+    if cached is not None:
+        parsed = parse_gemini_response(cached)
+        parsed.cache_key = key
+        return parsed
+
+    if api_key is None:
+        api_key = get_api_key()
+
+    request_body = build_request_body(
+        images=[(encode_image_bytes(data, mime_type), mime_type) for data, mime_type in files],
+        prompt=prompt,
+    )
+
+    response_text = call_gemini_api(request_body, api_key)
+    parsed = parse_gemini_response(response_text)
+
+    # Only keep responses that yielded something, so failures are retried
+    if parsed.recipient or parsed.iban or parsed.amount:
+        _cache_response(key, response_text)
+        parsed.cache_key = key
+
+    return parsed
+
+
 def quick_extract_bytes(
     image_data: bytes,
     mime_type: str = 'image/jpeg',
@@ -567,6 +681,25 @@ if __name__ == '__main__':
     assert invalid_result.amount == 0.0, 'Invalid should return defaults'
     print('[OK] Invalid response handling')
 
+    # Test OCR cache: a repeat is served from cache until evicted (API stubbed)
+    import tempfile
+    OCR_CACHE_FILE = Path(tempfile.mkdtemp()) / 'ocr_cache.json'
+    _OCR_CACHE = None
+    api_calls = []
+    real_call_gemini_api = call_gemini_api
+    call_gemini_api = lambda body, key: api_calls.append(key) or sample_response
+    pages = [(b'page-bytes', 'image/jpeg')]
+
+    first = parse_bill_images_bytes(pages, api_key='test')
+    again = parse_bill_images_bytes(pages, api_key='test')
+    assert len(api_calls) == 1, 'Repeat parse should come from cache'
+    assert first.cache_key and again.cache_key == first.cache_key, 'Parses should carry the cache key'
+    assert evict_cached_responses([first.cache_key, 'unknown']) == 1, 'Should evict one entry'
+    parse_bill_images_bytes(pages, api_key='test')
+    assert len(api_calls) == 2, 'Evicted pages should be sent to Gemini again'
+    call_gemini_api = real_call_gemini_api
+    print('[OK] OCR cache and eviction')
+
     # Test image encoding (if file provided)
     if len(sys.argv) > 1:
         image_path = Path(sys.argv[1])
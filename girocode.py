@@ -1,21 +1,65 @@
 #!/usr/bin/env python3
 """GiroCode (EPC QR) detection and parsing for payme."""
 
+import io
 import re
 import sys
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional
 
 try:
     from PIL import Image
-    from pyzbar import pyzbar
-    DEPENDENCIES_AVAILABLE = True
+    PIL_AVAILABLE = True
 except ImportError:
-    DEPENDENCIES_AVAILABLE = False
+    PIL_AVAILABLE = False
 
+try:
+    from pyzbar import pyzbar
+    PYZBAR_AVAILABLE = True
+except ImportError:
+    PYZBAR_AVAILABLE = False
 
-@dataclass
+# OpenCV's QRCodeDetector (multi-code decoding needs 4.3+) is preferred when
+# installed; pyzbar stays as the fallback backend
+try:
+    import cv2
+    import numpy as np
+    OPENCV_AVAILABLE = tuple(int(x) for x in cv2.__version__.split('.')[:2]) >= (4, 3)
+except (ImportError, ValueError):
+    OPENCV_AVAILABLE = False
+
+DEPENDENCIES_AVAILABLE = PIL_AVAILABLE and (OPENCV_AVAILABLE or PYZBAR_AVAILABLE)
+
+# EPC header values (lines 1-4)
+EPC_SERVICE_TAG = 'BCD'
+EPC_VERSIONS = ('001', '002')
+EPC_CHARSET_UTF8 = '1'
+EPC_IDENTIFICATION = 'SCT'
+
+# Canonical lines 1-4 (\n or \r\n terminated), checked with a single startswith
+_EPC_HEADERS = tuple(
+    newline.join((EPC_SERVICE_TAG, version, EPC_CHARSET_UTF8, EPC_IDENTIFICATION, ''))
+    for version in EPC_VERSIONS
+    for newline in ('\n', '\r\n')
+)
+
+# Lines 1-4 as one pattern (whitespace around values tolerated, as with strip())
+_HEADER_RE = re.compile(
+    rf'{EPC_SERVICE_TAG}[ \t\r]*\n'
+    rf'[ \t]*(?:{"|".join(EPC_VERSIONS)})[ \t\r]*\n'
+    rf'[ \t]*{EPC_CHARSET_UTF8}[ \t\r]*\n'
+    rf'[ \t]*{EPC_IDENTIFICATION}[ \t\r]*\n'
+)
+
+# Longest image side for the first (downscaled) QR scan pass
+QR_SCAN_MAX_SIDE = 1600
+
+# Fallback for malformed amount lines: first run of digits/dots
+_NUMBERS_RE = re.compile(r'[\d.]+')
+
+
+@dataclass(slots=True, frozen=True)
 class GiroCodeData:
     """Parsed GiroCode payment data."""
     bic: str
@@ -47,6 +91,44 @@ def check_dependencies() -> bool:
     return DEPENDENCIES_AVAILABLE
 
 
+def _parse_amount(amount_str: str) -> tuple[Optional[str], float]:
+    """
+    Parse EPC amount field: 3-letter currency followed by amount (e.g., EUR123.45).
+
+    Straight-line character checks instead of a regex; the grammar is
+    [A-Z]{3} followed by optional digits with up to 2 decimals. The
+    amount is computed from integer cents rather than float(str).
+    Returns (currency, amount), or (None, 0.0) if the field is malformed.
+    """
+    if len(amount_str) < 3 or not amount_str.isascii():
+        return None, 0.0
+
+    currency = amount_str[:3]
+    if not (currency.isalpha() and currency.isupper()):
+        return None, 0.0
+
+    rest = amount_str[3:]
+    if not rest:
+        return currency, 0.0
+
+    whole, dot, frac = rest.partition('.')
+    if not whole.isdigit():
+        return None, 0.0
+    if dot and not (frac.isdigit() and len(frac) <= 2):
+        return None, 0.0
+
+    # Exact integer cents, divided once (e.g. EUR12.5 -> 1250 -> 12.5)
+    cents = int(whole) * 100 + (int(frac.ljust(2, '0')) if frac else 0)
+    return currency, cents / 100
+
+
+# Compiled drop-in for _parse_amount, used when girocode_fast.pyx is built
+try:
+    from girocode_fast import _parse_amount
+except ImportError:
+    pass
+
+
 def parse_girocode(data: str) -> Optional[GiroCodeData]:
     """
     Parse EPC QR Code (GiroCode) data.
@@ -67,63 +149,53 @@ def parse_girocode(data: str) -> Optional[GiroCodeData]:
 
     Returns GiroCodeData or None if not valid GiroCode.
     """
-    if not data:
-        return None
-
-    lines = data.strip().split('\n')
-
-    # Must have at least 8 lines for valid GiroCode
-    if len(lines) < 8:
-        return None
-
-    # Check service tag
-    if lines[0].strip() != 'BCD':
+    # Fast reject: every EPC payload starts with the service tag
+    if not data or not data.startswith(EPC_SERVICE_TAG):
         return None
 
-    # Check version (001 or 002)
-    version = lines[1].strip()
-    if version not in ('001', '002'):
-        return None
+    # Validate service tag, version, character set and identification at once
+    if data.startswith(_EPC_HEADERS):
+        body = data.split('\n', 4)[4]
+    else:
+        # Non-canonical header: tolerate whitespace around the values
+        header = _HEADER_RE.match(data)
+        if not header:
+            return None
+        body = data[header.end():]
 
-    # Check character set (1 = UTF-8)
-    if lines[2].strip() != '1':
-        return None
+    # Field lines after the header (handles both \n and \r\n)
+    fields = body.rstrip().splitlines()
 
-    # Check identification (SCT = SEPA Credit Transfer)
-    if lines[3].strip() != 'SCT':
+    # Must have at least BIC, recipient, IBAN and amount lines
+    if len(fields) < 4:
         return None
 
-    # Parse fields (pad list to avoid index errors)
-    while len(lines) < 12:
-        lines.append('')
+    def field(index: int) -> str:
+        """Stripped field value, or '' if the optional line is missing."""
+        return fields[index].strip() if index < len(fields) else ''
 
-    bic = lines[4].strip()
-    recipient = lines[5].strip()
-    iban = lines[6].strip().replace(' ', '').upper()
+    bic = field(0)
+    recipient = field(1)
+    iban = field(2).replace(' ', '').upper()
 
     # Parse amount (format: EUR123.45 or just EUR for zero)
-    amount_str = lines[7].strip()
-    amount = 0.0
-    currency = 'EUR'
-
-    amount_match = re.match(r'^([A-Z]{3})(\d+(?:\.\d{1,2})?)$', amount_str)
-    if amount_match:
-        currency = amount_match.group(1)
-        amount = float(amount_match.group(2))
-    elif amount_str.upper() in ('EUR', ''):
-        amount = 0.0
-    else:
-        # Try to extract just numbers
-        numbers = re.findall(r'[\d.]+', amount_str)
-        if numbers:
-            try:
-                amount = float(numbers[0])
-            except ValueError:
-                pass
+    amount_str = field(3)
+    currency, amount = _parse_amount(amount_str)
+
+    if currency is None:
+        currency = 'EUR'
+        if any(c.isdigit() for c in amount_str):
+            # Try to extract just numbers
+            numbers = _NUMBERS_RE.findall(amount_str)
+            if numbers:
+                try:
+                    amount = float(numbers[0])
+                except ValueError:
+                    pass
 
-    purpose = lines[8].strip() if len(lines) > 8 else ''
-    reference = lines[9].strip() if len(lines) > 9 else ''
-    text = lines[10].strip() if len(lines) > 10 else ''
+    purpose = field(4)
+    reference = field(5)
+    text = field(6)
 
     # Validation: must have IBAN and recipient
     if not iban or not recipient:
@@ -142,43 +214,132 @@ def parse_girocode(data: str) -> Optional[GiroCodeData]:
     )
 
 
-def decode_qr_codes(image_path: Path) -> list[str]:
+def _open_grayscale(source) -> 'Image.Image':
     """
-    Detect and decode all QR codes in an image.
+    Open an image (path or file object) as single-channel grayscale.
 
-    Returns list of decoded data strings.
+    For JPEGs, draft mode makes libjpeg decode the luma plane directly,
+    so no RGB image is built and then converted.
     """
-    if not DEPENDENCIES_AVAILABLE:
-        raise RuntimeError(
-            'QR detection requires pyzbar and Pillow. '
-            'Install with: pip install pyzbar Pillow'
-        )
+    image = Image.open(source)
+    image.draft('L', image.size)
+    if image.mode == 'L':
+        return image
+    return image.convert('L')
 
-    # Read image with PIL
-    image = Image.open(str(image_path))
 
-    # Convert to grayscale for better detection
-    gray = image.convert('L')
+def _downscaled(gray: 'Image.Image') -> Optional['Image.Image']:
+    """
+    Copy of a large grayscale image capped at QR_SCAN_MAX_SIDE, or None.
 
-    # Detect QR codes
-    codes = pyzbar.decode(gray)
+    GiroCodes are printed large on bills, so the smaller copy usually
+    decodes fine with far fewer pixels to scan.
+    """
+    longest = max(gray.size)
+    if longest <= QR_SCAN_MAX_SIDE:
+        return None
+    scale = QR_SCAN_MAX_SIDE / longest
+    return gray.resize(
+        (max(1, round(gray.width * scale)), max(1, round(gray.height * scale))),
+        Image.BOX,
+    )
+
+
+def _decode_opencv(gray: 'Image.Image') -> Iterator[str]:
+    """
+    Decode all QR codes in one pass with OpenCV (strings are already UTF-8).
+
+    Yields largest codes first; GiroCodes are usually the biggest on a page.
+    """
+    detector = cv2.QRCodeDetector()
+    ok, decoded, points, _ = detector.detectAndDecodeMulti(np.asarray(gray))
+    if not ok:
+        return
+    found = sorted(
+        zip(decoded, points),
+        key=lambda item: cv2.contourArea(item[1]),
+        reverse=True,
+    )
+    for data, _ in found:
+        if data:
+            yield data
+
+
+def _decode_pyzbar(gray: 'Image.Image') -> Iterator[str]:
+    """Decode QR codes (not barcodes) with pyzbar, largest first."""
+    codes = [code for code in pyzbar.decode(gray) if code.type == 'QRCODE']
+    codes.sort(key=lambda code: code.rect.width * code.rect.height, reverse=True)
 
-    # Extract data from QR codes only (not barcodes)
-    results = []
     for code in codes:
-        if code.type == 'QRCODE':
+        try:
+            yield code.data.decode('utf-8')
+        except UnicodeDecodeError:
+            # Try latin-1 as fallback
             try:
-                data = code.data.decode('utf-8')
-                results.append(data)
+                yield code.data.decode('latin-1')
             except UnicodeDecodeError:
-                # Try latin-1 as fallback
-                try:
-                    data = code.data.decode('latin-1')
-                    results.append(data)
-                except UnicodeDecodeError:
-                    continue
+                continue
+
+
+def _iter_payloads(gray: 'Image.Image') -> Iterator[str]:
+    """
+    Yield QR payloads from a grayscale image one at a time.
+
+    Tries the downscaled copy first, then full resolution; at each size
+    OpenCV is used if available, with pyzbar as fallback. Stops after the
+    first backend that finds anything, so callers can break out early.
+    """
+    small = _downscaled(gray)
+    for image in (small, gray):
+        if image is None:
+            continue
+        for decode in _BACKENDS:
+            found = False
+            for data in decode(image):
+                found = True
+                yield data
+            if found:
+                return
+
+
+# Decoders in preference order, fixed by what was importable at load time
+_BACKENDS = tuple(
+    decode for decode, available in (
+        (_decode_opencv, OPENCV_AVAILABLE),
+        (_decode_pyzbar, PYZBAR_AVAILABLE),
+    )
+    if available
+)
+
+
+def _require_dependencies() -> None:
+    """Raise if no QR backend is installed."""
+    if not DEPENDENCIES_AVAILABLE:
+        raise RuntimeError(
+            'QR detection requires Pillow plus opencv or pyzbar. '
+            'Install with: pip install Pillow opencv-python-headless pyzbar'
+        )
+
+
+def iter_qr_codes(image_path: Path) -> Iterator[str]:
+    """
+    Detect and decode QR codes in an image, yielding one payload at a time.
+    """
+    _require_dependencies()
+
+    # Read image with PIL as grayscale for better detection
+    gray = _open_grayscale(str(image_path))
 
-    return results
+    yield from _iter_payloads(gray)
+
+
+def decode_qr_codes(image_path: Path) -> list[str]:
+    """
+    Detect and decode all QR codes in an image.
+
+    Returns list of decoded data strings.
+    """
+    return list(iter_qr_codes(image_path))
 
 
 def extract_girocode(image_path: Path) -> Optional[GiroCodeData]:
@@ -193,9 +354,7 @@ def extract_girocode(image_path: Path) -> Optional[GiroCodeData]:
     if not image_path.exists():
         raise FileNotFoundError(f'Image not found: {image_path}')
 
-    qr_codes = decode_qr_codes(image_path)
-
-    for qr_data in qr_codes:
+    for qr_data in iter_qr_codes(image_path):
         girocode = parse_girocode(qr_data)
         if girocode:
             return girocode
@@ -209,32 +368,15 @@ def extract_girocode_from_bytes(image_data: bytes) -> Optional[GiroCodeData]:
 
     Returns first valid GiroCode found, or None.
     """
-    if not DEPENDENCIES_AVAILABLE:
-        raise RuntimeError(
-            'QR detection requires pyzbar and Pillow. '
-            'Install with: pip install pyzbar Pillow'
-        )
-
-    import io
-
-    # Decode image from bytes using PIL
-    image = Image.open(io.BytesIO(image_data))
+    _require_dependencies()
 
-    # Convert to grayscale
-    gray = image.convert('L')
+    # Decode image from bytes using PIL, directly as grayscale
+    gray = _open_grayscale(io.BytesIO(image_data))
 
-    # Detect QR codes
-    codes = pyzbar.decode(gray)
-
-    for code in codes:
-        if code.type == 'QRCODE':
-            try:
-                data = code.data.decode('utf-8')
-                girocode = parse_girocode(data)
-                if girocode:
-                    return girocode
-            except UnicodeDecodeError:
-                continue
+    for data in _iter_payloads(gray):
+        girocode = parse_girocode(data)
+        if girocode:
+            return girocode
 
     return None
 
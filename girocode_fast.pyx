@@ -0,0 +1,69 @@
+# cython: language_level=3
+"""
+Optional compiled amount parser for girocode.py.
+
+Build in place next to girocode.py (needs Cython and a C compiler):
+
+    cythonize -i girocode_fast.pyx
+
+girocode.py falls back to its pure-Python _parse_amount when the
+extension is not built.
+"""
+
+
+cpdef tuple _parse_amount(str amount_str):
+    """
+    Parse EPC amount field: 3-letter currency followed by amount (e.g., EUR123.45).
+
+    Same grammar and results as girocode._parse_amount, except that more
+    than 15 integer digits (far past the EPC maximum) count as malformed.
+    Returns (currency, amount), or (None, 0.0) if the field is malformed.
+    """
+    cdef Py_ssize_t n = len(amount_str)
+    cdef Py_ssize_t i
+    cdef Py_UCS4 c
+    cdef long long whole = 0
+    cdef int frac = 0
+    cdef int frac_digits = 0
+    cdef int whole_digits = 0
+    cdef bint seen_dot = False
+
+    if n < 3:
+        return None, 0.0
+
+    for i in range(3):
+        c = amount_str[i]
+        if c < u'A' or c > u'Z':
+            return None, 0.0
+
+    currency = amount_str[:3]
+    if n == 3:
+        return currency, 0.0
+
+    for i in range(3, n):
+        c = amount_str[i]
+        if c == u'.':
+            if seen_dot:
+                return None, 0.0
+            seen_dot = True
+        elif u'0' <= c <= u'9':
+            if seen_dot:
+                frac_digits += 1
+                if frac_digits > 2:
+                    return None, 0.0
+                frac = frac * 10 + (<int>c - <int>u'0')
+            else:
+                whole_digits += 1
+                if whole_digits > 15:
+                    return None, 0.0
+                whole = whole * 10 + (<int>c - <int>u'0')
+        else:
+            return None, 0.0
+
+    if whole_digits == 0 or (seen_dot and frac_digits == 0):
+        return None, 0.0
+
+    if frac_digits == 1:
+        frac *= 10
+
+    return currency, (whole * 100 + frac) / 100.0
@@ -1,26 +1,59 @@
 #!/usr/bin/env python3
 """Google Drive API client for payme."""
 
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from itertools import pairwise
+from operator import itemgetter
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
 
 from config import (
     GOOGLE_TOKENS_FILE,
     ALBUM_CACHE_FILE,
-    PROCESSED_PHOTOS_FILE,
     PHOTO_GROUPING_MINUTES,
+    PHOTO_DOWNLOAD_WORKERS,
     get_env,
 )
-from storage import load_json, save_json
+from storage import (
+    load_json,
+    save_json,
+    processed_photo_ids,
+    add_processed_photo_ids,
+    remove_processed_photo_ids,
+)
 from http_client import get_json, HttpError
 
 # Google Drive API base
 GOOGLE_DRIVE_API_BASE = 'https://www.googleapis.com/drive/v3'
 
+# files.list page size (1000 is the Drive API maximum)
+DRIVE_PAGE_SIZE = 1000
+
 # OAuth endpoints
 GOOGLE_TOKEN_URL = 'https://oauth2.googleapis.com/token'
 
+# Shared keep-alive session so Drive calls reuse TCP/TLS connections
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
+# In-process copy of the current access token, so repeated API calls
+# don't re-read google_tokens.json while the token is still valid
+_TOKEN_CACHE = {'access_token': None, 'expires_at': None}
+
+# Sort key for file dicts (list_folder_photos always sets creationTime)
+_BY_CREATION_TIME = itemgetter('creationTime')
+
+# Resolved bill folder ID, kept for the life of the process
+_FOLDER_ID_CACHE: Optional[str] = None
+
+# Serializes token load/refresh so parallel downloads don't refresh at once
+_TOKEN_LOCK = threading.Lock()
+
 
 def load_tokens() -> dict:
     """Load OAuth tokens from storage."""
@@ -39,8 +72,7 @@ def refresh_access_token(refresh_token: str, client_id: str, client_secret: str)
     Returns dict with new access_token and expires_in.
     Raises HttpError on failure.
     """
-    import requests
-    response = requests.post(
+    response = _SESSION.post(
         GOOGLE_TOKEN_URL,
         data={
             'grant_type': 'refresh_token',
@@ -61,13 +93,32 @@ def refresh_access_token(refresh_token: str, client_id: str, client_secret: str)
     return result
 
 
+def reset_token_cache() -> None:
+    """Forget the in-process access token (e.g. after a 401)."""
+    _TOKEN_CACHE['access_token'] = None
+    _TOKEN_CACHE['expires_at'] = None
+
+
 def get_valid_access_token() -> str:
     """
     Get a valid access token, refreshing if necessary.
 
+    Thread-safe: only one caller loads or refreshes the token at a time.
     Returns access token string.
     Raises HttpError if token refresh fails.
     """
+    with _TOKEN_LOCK:
+        return _load_access_token()
+
+
+def _load_access_token() -> str:
+    """Return cached token, or load from storage and refresh if expired."""
+    # Serve from memory while the cached token is valid (with 5 min buffer)
+    cached_expires = _TOKEN_CACHE['expires_at']
+    if _TOKEN_CACHE['access_token'] and cached_expires:
+        if datetime.now() < cached_expires - timedelta(minutes=5):
+            return _TOKEN_CACHE['access_token']
+
     tokens = load_tokens()
 
     if not tokens:
@@ -84,6 +135,7 @@ def get_valid_access_token() -> str:
 
     # Check if token needs refresh (with 5 min buffer)
     needs_refresh = True
+    expires_dt = None
     if expires_at and access_token:
         expires_dt = datetime.fromisoformat(expires_at)
         if datetime.now() < expires_dt - timedelta(minutes=5):
@@ -98,7 +150,9 @@ def get_valid_access_token() -> str:
         # Update stored tokens
         tokens['access_token'] = new_tokens['access_token']
         expires_in = new_tokens.get('expires_in', 3600)
-        tokens['expires_at'] = (datetime.now() + timedelta(seconds=expires_in)).isoformat()
+        expires_dt = datetime.now() + timedelta(seconds=expires_in)
+        tokens['expires_at'] = expires_dt.isoformat()
+        tokens['expires_at_epoch'] = expires_dt.timestamp()
 
         # Refresh token might be rotated
         if 'refresh_token' in new_tokens:
@@ -107,6 +161,9 @@ def get_valid_access_token() -> str:
         save_tokens(tokens)
         access_token = tokens['access_token']
 
+    _TOKEN_CACHE['access_token'] = access_token
+    _TOKEN_CACHE['expires_at'] = expires_dt
+
     return access_token
 
 
@@ -175,6 +232,31 @@ def check_token_health() -> dict:
     }
 
 
+def _iter_drive_files(params: dict, headers: dict):
+    """
+    Yield file entries from a Drive files.list query across all pages.
+
+    The next page is requested on a worker thread as soon as its token is
+    known, so it downloads while the caller processes the current page.
+    """
+    url = f'{GOOGLE_DRIVE_API_BASE}/files'
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(get_json, url, headers=headers, params=params)
+
+        while future is not None:
+            response = future.result()
+
+            page_token = response.get('nextPageToken')
+            future = None
+            if page_token:
+                future = executor.submit(
+                    get_json, url, headers=headers, params={**params, 'pageToken': page_token},
+                )
+
+            yield from response.get('files', [])
+
+
 def list_folders() -> list[dict]:
     """
     List all folders in user's Google Drive.
@@ -182,35 +264,19 @@ def list_folders() -> list[dict]:
     Returns list of folder dicts with id, name.
     """
     headers = get_auth_headers()
-    folders = []
-    page_token = None
-
-    while True:
-        params = {
-            'q': "mimeType='application/vnd.google-apps.folder' and trashed=false",
-            'fields': 'nextPageToken, files(id, name)',
-            'pageSize': 100,
-        }
-        if page_token:
-            params['pageToken'] = page_token
-
-        response = get_json(
-            f'{GOOGLE_DRIVE_API_BASE}/files',
-            headers=headers,
-            params=params,
-        )
-
-        for folder in response.get('files', []):
-            folders.append({
-                'id': folder.get('id'),
-                'title': folder.get('name', ''),
-            })
-
-        page_token = response.get('nextPageToken')
-        if not page_token:
-            break
+    params = {
+        'q': "mimeType='application/vnd.google-apps.folder' and trashed=false",
+        'fields': 'nextPageToken, files(id, name)',
+        'pageSize': DRIVE_PAGE_SIZE,
+    }
 
-    return folders
+    return [
+        {
+            'id': folder.get('id'),
+            'title': folder.get('name', ''),
+        }
+        for folder in _iter_drive_files(params, headers)
+    ]
 
 
 def find_folder(name: str = None, folder_id: str = None) -> Optional[dict]:
@@ -243,29 +309,44 @@ def find_folder(name: str = None, folder_id: str = None) -> Optional[dict]:
         name = get_env('PAYME_ALBUM_NAME', 'bill-pay')
 
     name_normalized = name.strip().lower()
-    folders = list_folders()
 
-    for folder in folders:
+    # Single pass: return exact match, remember first fuzzy (containment) match
+    fuzzy_match = None
+    for folder in list_folders():
         title_normalized = folder['title'].strip().lower()
         if title_normalized == name_normalized:
             return folder
+        if fuzzy_match is None and (
+            name_normalized in title_normalized or title_normalized in name_normalized
+        ):
+            fuzzy_match = folder
+
+    return fuzzy_match
 
-    # Fuzzy match: check if name is contained
-    for folder in folders:
-        title_normalized = folder['title'].strip().lower()
-        if name_normalized in title_normalized or title_normalized in name_normalized:
-            return folder
 
-    return None
+def invalidate_folder_cache() -> None:
+    """Forget the in-process folder ID (e.g. after changing PAYME_ALBUM_*)."""
+    global _FOLDER_ID_CACHE
+    _FOLDER_ID_CACHE = None
 
 
 def get_folder_id() -> str:
     """
     Get configured folder ID, finding by name if needed.
 
-    Caches folder ID for future calls.
+    Caches folder ID in-process and on disk for future calls.
     Raises HttpError if folder not found.
     """
+    global _FOLDER_ID_CACHE
+    if _FOLDER_ID_CACHE:
+        return _FOLDER_ID_CACHE
+
+    _FOLDER_ID_CACHE = _resolve_folder_id()
+    return _FOLDER_ID_CACHE
+
+
+def _resolve_folder_id() -> str:
+    """Resolve folder ID from env, the disk cache, or a Drive search."""
     # Check for configured folder ID first
     folder_id = get_env('PAYME_ALBUM_ID', '')
     if folder_id:
@@ -302,57 +383,53 @@ def list_folder_photos(folder_id: str = None) -> list[dict]:
         folder_id = get_folder_id()
 
     headers = get_auth_headers()
-    photos = []
-    page_token = None
-
-    while True:
-        # Query for image files and PDFs in the folder
-        query = f"'{folder_id}' in parents and (mimeType contains 'image/' or mimeType contains 'pdf') and trashed=false"
-        params = {
-            'q': query,
-            'fields': 'nextPageToken, files(id, name, mimeType, createdTime, imageMediaMetadata)',
-            'pageSize': 100,
-            'orderBy': 'createdTime',
-        }
-        if page_token:
-            params['pageToken'] = page_token
 
-        response = get_json(
-            f'{GOOGLE_DRIVE_API_BASE}/files',
-            headers=headers,
-            params=params,
-        )
+    # Query for image files and PDFs in the folder
+    query = f"'{folder_id}' in parents and (mimeType contains 'image/' or mimeType contains 'pdf') and trashed=false"
+    params = {
+        'q': query,
+        'fields': 'nextPageToken, files(id, name, mimeType, createdTime, imageMediaMetadata)',
+        'pageSize': DRIVE_PAGE_SIZE,
+        'orderBy': 'createdTime',
+    }
 
-        for item in response.get('files', []):
-            metadata = item.get('imageMediaMetadata', {})
-            photos.append({
-                'id': item.get('id'),
-                'filename': item.get('name', ''),
-                'mimeType': item.get('mimeType', ''),
-                'creationTime': item.get('createdTime', ''),
-                'width': int(metadata.get('width', 0)),
-                'height': int(metadata.get('height', 0)),
-            })
-
-        page_token = response.get('nextPageToken')
-        if not page_token:
-            break
+    photos = []
+    for item in _iter_drive_files(params, headers):
+        metadata = item.get('imageMediaMetadata', {})
+        photos.append({
+            'id': item.get('id'),
+            'filename': item.get('name', ''),
+            'mimeType': item.get('mimeType', ''),
+            'creationTime': item.get('createdTime', ''),
+            'width': int(metadata.get('width', 0)),
+            'height': int(metadata.get('height', 0)),
+        })
 
     return photos
 
 
 def get_processed_photos() -> set[str]:
-    """Get set of already processed photo IDs."""
-    data = load_json(PROCESSED_PHOTOS_FILE, {'processed': []})
-    return set(data.get('processed', []))
+    """Get set of already processed photo IDs. Do not mutate the returned set."""
+    return processed_photo_ids()
+
+
+def mark_photos_processed(photo_ids: Iterable[str]) -> None:
+    """Mark several photos as processed (one append of all new IDs to the log)."""
+    add_processed_photo_ids(photo_ids)
 
 
 def mark_photo_processed(photo_id: str) -> None:
-    """Mark a photo as processed."""
-    data = load_json(PROCESSED_PHOTOS_FILE, {'processed': []})
-    if photo_id not in data['processed']:
-        data['processed'].append(photo_id)
-        save_json(PROCESSED_PHOTOS_FILE, data)
+    """Mark a photo as processed (appends one line to the log)."""
+    mark_photos_processed([photo_id])
+
+
+def unmark_photos_processed(photo_ids: set[str]) -> int:
+    """
+    Remove photo IDs from the processed log so they are picked up again.
+
+    Returns number of IDs removed.
+    """
+    return remove_processed_photo_ids(photo_ids)
 
 
 def get_new_photos(folder_id: str = None) -> list[dict]:
@@ -367,29 +444,29 @@ def get_new_photos(folder_id: str = None) -> list[dict]:
     new_photos = [p for p in all_photos if p['id'] not in processed]
 
     # Sort by creation time
-    new_photos.sort(key=lambda p: p.get('creationTime', ''))
+    new_photos.sort(key=_BY_CREATION_TIME)
 
     return new_photos
 
 
-def _within_grouping_window(prev_time: str, current_time: str) -> bool:
+def _parse_creation_time(value: str) -> Optional[datetime]:
     """
-    Check if two ISO timestamps are within the grouping window.
+    Parse a Drive RFC 3339 timestamp (e.g. 2024-01-15T10:00:00.000Z).
 
-    Returns True if times are within PHOTO_GROUPING_MINUTES of each other.
+    Returns None if missing or malformed.
     """
-    if not prev_time or not current_time:
-        return False
-
     try:
-        # Parse ISO timestamps (handle both 'Z' suffix and '+00:00')
-        prev_dt = datetime.fromisoformat(prev_time.replace('Z', '+00:00'))
-        current_dt = datetime.fromisoformat(current_time.replace('Z', '+00:00'))
-
-        diff = abs((current_dt - prev_dt).total_seconds())
-        return diff <= PHOTO_GROUPING_MINUTES * 60
+        fmt = '%Y-%m-%dT%H:%M:%S.%fZ' if '.' in value else '%Y-%m-%dT%H:%M:%SZ'
+        return datetime.strptime(value, fmt)
     except (ValueError, TypeError):
-        return False
+        return None
+
+
+def _is_sorted(photos: list[dict]) -> bool:
+    """Check in one pass whether photos are already in creation-time order."""
+    return all(
+        _BY_CREATION_TIME(a) <= _BY_CREATION_TIME(b) for a, b in pairwise(photos)
+    )
 
 
 def group_photos_by_time(photos: list[dict]) -> list[list[dict]]:
@@ -400,22 +477,31 @@ def group_photos_by_time(photos: list[dict]) -> list[list[dict]]:
     if not photos:
         return []
 
-    # Sort by creation time
-    sorted_photos = sorted(photos, key=lambda p: p.get('creationTime', ''))
+    # Sort by creation time (get_new_photos already returns them sorted)
+    if _is_sorted(photos):
+        sorted_photos = photos
+    else:
+        sorted_photos = sorted(photos, key=_BY_CREATION_TIME)
+
+    # Parse each timestamp once; unparseable ones never join a group
+    times = [_parse_creation_time(p['creationTime']) for p in sorted_photos]
+    window_seconds = PHOTO_GROUPING_MINUTES * 60
 
     groups = []
     current_group = [sorted_photos[0]]
 
-    for photo in sorted_photos[1:]:
-        current_time = photo.get('creationTime', '')
-        prev_time = current_group[-1].get('creationTime', '')
+    for i in range(1, len(sorted_photos)):
+        prev_time = times[i - 1]
+        current_time = times[i]
 
-        # Parse timestamps and check if within grouping window
-        if _within_grouping_window(prev_time, current_time):
-            current_group.append(photo)
+        if (
+            prev_time and current_time
+            and abs((current_time - prev_time).total_seconds()) <= window_seconds
+        ):
+            current_group.append(sorted_photos[i])
         else:
             groups.append(current_group)
-            current_group = [photo]
+            current_group = [sorted_photos[i]]
 
     groups.append(current_group)
     return groups
@@ -425,13 +511,14 @@ def group_photos_by_time(photos: list[dict]) -> list[list[dict]]:
 MAX_FILE_SIZE_MB = 20
 
 
-def download_photo(photo: dict, size: str = 'full') -> bytes:
+def download_photo(photo: dict, size: str = 'full', headers: dict = None) -> bytes:
     """
     Download photo content from Google Drive.
 
     Args:
         photo: Photo dict with id
         size: Not used for Drive (always downloads full file)
+        headers: Auth headers to reuse (fetched if not given)
 
     Returns:
         Image bytes
@@ -440,20 +527,19 @@ def download_photo(photo: dict, size: str = 'full') -> bytes:
         ValueError: If file exceeds MAX_FILE_SIZE_MB
         HttpError: If download fails
     """
-    import requests
-
     file_id = photo.get('id')
     if not file_id:
         raise ValueError('Photo has no id')
 
-    headers = get_auth_headers()
+    if headers is None:
+        headers = get_auth_headers()
 
     # First check file size via metadata
     metadata_url = f'{GOOGLE_DRIVE_API_BASE}/files/{file_id}'
     metadata_params = {'fields': 'size,name'}
 
     try:
-        metadata_response = requests.get(
+        metadata_response = _SESSION.get(
             metadata_url,
             headers=headers,
             params=metadata_params,
@@ -477,14 +563,40 @@ def download_photo(photo: dict, size: str = 'full') -> bytes:
     # Use alt=media to download file content
     url = f'{GOOGLE_DRIVE_API_BASE}/files/{file_id}?alt=media'
 
-    response = requests.get(url, headers=headers, timeout=60)
+    response = _SESSION.get(url, headers=headers, timeout=60)
 
+    if response.status_code == 401:
+        reset_token_cache()
     if response.status_code != 200:
         raise HttpError(f'Failed to download file: HTTP {response.status_code}')
 
     return response.content
 
 
+def download_photos_parallel(
+    photos: list[dict],
+    size: str = 'full',
+    max_workers: int = PHOTO_DOWNLOAD_WORKERS,
+) -> list[bytes]:
+    """
+    Download several photos concurrently, sharing one set of auth headers.
+
+    Returns image bytes in the same order as photos.
+    Raises the first download error encountered.
+    """
+    if not photos:
+        return []
+
+    headers = get_auth_headers()
+    workers = min(max_workers, len(photos))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda photo: download_photo(photo, size, headers=headers),
+            photos,
+        ))
+
+
 def download_photo_to_file(photo: dict, output_path: Path, size: str = 'full') -> Path:
     """Download photo to file. Returns output path."""
     output_path = Path(output_path)
@@ -2,24 +2,40 @@
 """Google Photos API client for payme."""
 
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional
 
 from config import (
     GOOGLE_PHOTOS_API_BASE,
+    GOOGLE_PHOTOS_ALBUM_PAGE_SIZE,
+    GOOGLE_PHOTOS_MEDIA_PAGE_SIZE,
     GOOGLE_TOKENS_FILE,
     ALBUM_CACHE_FILE,
     PROCESSED_PHOTOS_FILE,
+    PROCESSED_PHOTOS_LOG_FILE,
     PHOTO_GROUPING_MINUTES,
+    PHOTO_DOWNLOAD_WORKERS,
     get_env,
 )
-from storage import load_json, save_json, update_dict
-from http_client import get, post, get_json, post_json, download, HttpError
+from storage import load_json, save_json, update_dict, processed_photo_ids, add_processed_photo_ids
+from http_client import get, post, get_json, post_json, download, download_to_file, HttpError
 
 # OAuth endpoints
 GOOGLE_TOKEN_URL = 'https://oauth2.googleapis.com/token'
 
+# Album list kept in ALBUM_CACHE_FILE is refreshed after this long
+ALBUM_LIST_CACHE_HOURS = 24
+
+# Refresh access tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN_SECONDS = 600
+
+# In-process access token, so API calls don't re-read the tokens file
+# (expires_at is a POSIX timestamp)
+_TOKEN_CACHE = {'access_token': None, 'expires_at': None}
+
 
 def load_tokens() -> dict:
     """Load OAuth tokens from storage."""
@@ -55,6 +71,30 @@ def refresh_access_token(refresh_token: str, client_id: str, client_secret: str)
     return response
 
 
+def _expires_at_epoch(tokens: dict) -> Optional[float]:
+    """
+    Absolute token expiry as a POSIX timestamp.
+
+    Uses expires_at_epoch, written at refresh time; falls back to parsing
+    the ISO expires_at for token files written before it existed.
+    """
+    expires_epoch = tokens.get('expires_at_epoch')
+    if expires_epoch:
+        return float(expires_epoch)
+
+    expires_at = tokens.get('expires_at')
+    if expires_at:
+        return datetime.fromisoformat(expires_at).timestamp()
+
+    return None
+
+
+def reset_token_cache() -> None:
+    """Forget the in-process access token (e.g. after a 401)."""
+    _TOKEN_CACHE['access_token'] = None
+    _TOKEN_CACHE['expires_at'] = None
+
+
 def get_valid_access_token() -> str:
     """
     Get a valid access token, refreshing if necessary.
@@ -62,6 +102,12 @@ def get_valid_access_token() -> str:
     Returns access token string.
     Raises HttpError if token refresh fails.
     """
+    # Serve from memory while the cached token is valid
+    cached_expires = _TOKEN_CACHE['expires_at']
+    if _TOKEN_CACHE['access_token'] and cached_expires:
+        if time.time() < cached_expires - TOKEN_REFRESH_MARGIN_SECONDS:
+            return _TOKEN_CACHE['access_token']
+
     tokens = load_tokens()
 
     if not tokens:
@@ -69,18 +115,17 @@ def get_valid_access_token() -> str:
 
     access_token = tokens.get('access_token')
     refresh_token = tokens.get('refresh_token')
-    expires_at = tokens.get('expires_at')
+    expires_epoch = _expires_at_epoch(tokens)
     client_id = tokens.get('client_id')
     client_secret = tokens.get('client_secret')
 
     if not refresh_token:
         raise HttpError('No refresh token found. Re-run authorize_google.py.')
 
-    # Check if token needs refresh (with 5 min buffer)
+    # Check if token needs refresh
     needs_refresh = True
-    if expires_at and access_token:
-        expires_dt = datetime.fromisoformat(expires_at)
-        if datetime.now() < expires_dt - timedelta(minutes=5):
+    if expires_epoch and access_token:
+        if time.time() < expires_epoch - TOKEN_REFRESH_MARGIN_SECONDS:
             needs_refresh = False
 
     if needs_refresh:
@@ -92,7 +137,9 @@ def get_valid_access_token() -> str:
         # Update stored tokens
         tokens['access_token'] = new_tokens['access_token']
         expires_in = new_tokens.get('expires_in', 3600)
-        tokens['expires_at'] = (datetime.now() + timedelta(seconds=expires_in)).isoformat()
+        expires_epoch = time.time() + expires_in
+        tokens['expires_at_epoch'] = expires_epoch
+        tokens['expires_at'] = datetime.fromtimestamp(expires_epoch).isoformat()
 
         # Refresh token might be rotated
         if 'refresh_token' in new_tokens:
@@ -101,6 +148,9 @@ def get_valid_access_token() -> str:
         save_tokens(tokens)
         access_token = tokens['access_token']
 
+    _TOKEN_CACHE['access_token'] = access_token
+    _TOKEN_CACHE['expires_at'] = expires_epoch
+
     return access_token
 
 
@@ -169,39 +219,64 @@ def check_token_health() -> dict:
     }
 
 
-def list_albums() -> list[dict]:
+def _iter_pages(fetch_page: Callable[[Optional[str]], dict], key: str) -> Iterator[dict]:
     """
-    List all albums in user's Google Photos.
+    Yield items under `key` from a paginated Photos API listing.
 
-    Returns list of album dicts with id, title, mediaItemsCount.
+    fetch_page(page_token) returns one response page. The next page is
+    requested on a worker thread as soon as its token is known, so it
+    downloads while the caller processes the current page.
+    """
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch_page, None)
+
+        while future is not None:
+            try:
+                response = future.result()
+            except HttpError as e:
+                if e.status_code == 401:
+                    reset_token_cache()
+                raise
+
+            page_token = response.get('nextPageToken')
+            future = executor.submit(fetch_page, page_token) if page_token else None
+
+            yield from response.get(key, [])
+
+
+def iter_albums() -> Iterator[dict]:
+    """
+    Yield albums in user's Google Photos one at a time, page by page.
+
+    Yields album dicts with id, title, mediaItemsCount.
     """
     headers = get_auth_headers()
-    albums = []
-    page_token = None
 
-    while True:
-        params = {'pageSize': 50}
+    def fetch_page(page_token: Optional[str]) -> dict:
+        params = {'pageSize': GOOGLE_PHOTOS_ALBUM_PAGE_SIZE}
         if page_token:
             params['pageToken'] = page_token
-
-        response = get_json(
+        return get_json(
             f'{GOOGLE_PHOTOS_API_BASE}/albums',
             headers=headers,
             params=params,
         )
 
-        for album in response.get('albums', []):
-            albums.append({
-                'id': album.get('id'),
-                'title': album.get('title', ''),
-                'mediaItemsCount': int(album.get('mediaItemsCount', 0)),
-            })
+    for album in _iter_pages(fetch_page, 'albums'):
+        yield {
+            'id': album.get('id'),
+            'title': album.get('title', ''),
+            'mediaItemsCount': int(album.get('mediaItemsCount', 0)),
+        }
 
-        page_token = response.get('nextPageToken')
-        if not page_token:
-            break
 
-    return albums
+def list_albums() -> list[dict]:
+    """
+    List all albums in user's Google Photos.
+
+    Returns list of album dicts with id, title, mediaItemsCount.
+    """
+    return list(iter_albums())
 
 
 def find_album(name: str = None, album_id: str = None) -> Optional[dict]:
@@ -226,7 +301,9 @@ def find_album(name: str = None, album_id: str = None) -> Optional[dict]:
                 'title': response.get('title', ''),
                 'mediaItemsCount': int(response.get('mediaItemsCount', 0)),
             }
-        except HttpError:
+        except HttpError as e:
+            if e.status_code == 401:
+                reset_token_cache()
             return None
 
     # Search by name
@@ -234,20 +311,57 @@ def find_album(name: str = None, album_id: str = None) -> Optional[dict]:
         name = get_env('PAYME_ALBUM_NAME', 'bill-pay')
 
     name_normalized = name.strip().lower()
-    albums = list_albums()
 
-    for album in albums:
+    # The cached album list only answers exact matches; a fuzzy hit there
+    # could hide a newer album with the exact title
+    cached_albums = _load_cached_albums()
+    if cached_albums:
+        for album in cached_albums:
+            if album['title'].strip().lower() == name_normalized:
+                return album
+
+    # Cache stale or no exact match: stream pages from the API, stop at the
+    # first exact match and remember the first fuzzy (containment) match
+    albums = []
+    fuzzy_match = None
+    for album in iter_albums():
+        albums.append(album)
         title_normalized = album['title'].strip().lower()
         if title_normalized == name_normalized:
-            return album
+            break
+        if fuzzy_match is None and (
+            name_normalized in title_normalized or title_normalized in name_normalized
+        ):
+            fuzzy_match = album
+    else:
+        album = fuzzy_match
 
-    # Fuzzy match: check if name is contained
-    for album in albums:
-        title_normalized = album['title'].strip().lower()
-        if name_normalized in title_normalized or title_normalized in name_normalized:
-            return album
+    # Albums seen so far (the full list unless we stopped early)
+    _save_cached_albums(albums)
 
-    return None
+    return album
+
+
+def _load_cached_albums() -> Optional[list[dict]]:
+    """Album list from ALBUM_CACHE_FILE, or None if missing or older than the TTL."""
+    cache = load_json(ALBUM_CACHE_FILE, {})
+    albums = cache.get('albums')
+    cached_at = cache.get('albums_cached_at')
+    if not albums or not cached_at:
+        return None
+
+    if datetime.now() - datetime.fromisoformat(cached_at) > timedelta(hours=ALBUM_LIST_CACHE_HOURS):
+        return None
+
+    return albums
+
+
+def _save_cached_albums(albums: list[dict]) -> None:
+    """Store album list (id, title, mediaItemsCount) in ALBUM_CACHE_FILE."""
+    cache = load_json(ALBUM_CACHE_FILE, {})
+    cache['albums'] = albums
+    cache['albums_cached_at'] = datetime.now().isoformat()
+    save_json(ALBUM_CACHE_FILE, cache)
 
 
 def get_album_id() -> str:
@@ -294,54 +408,49 @@ def list_album_photos(album_id: str = None) -> list[dict]:
         album_id = get_album_id()
 
     headers = get_auth_headers()
-    photos = []
-    page_token = None
 
-    while True:
+    def fetch_page(page_token: Optional[str]) -> dict:
         body = {
             'albumId': album_id,
-            'pageSize': 100,
+            'pageSize': GOOGLE_PHOTOS_MEDIA_PAGE_SIZE,
         }
         if page_token:
             body['pageToken'] = page_token
-
-        response = post_json(
+        return post_json(
             f'{GOOGLE_PHOTOS_API_BASE}/mediaItems:search',
             headers=headers,
             json=body,
         )
 
-        for item in response.get('mediaItems', []):
-            metadata = item.get('mediaMetadata', {})
-            photos.append({
-                'id': item.get('id'),
-                'filename': item.get('filename', ''),
-                'mimeType': item.get('mimeType', ''),
-                'creationTime': metadata.get('creationTime', ''),
-                'baseUrl': item.get('baseUrl'),
-                'width': int(metadata.get('width', 0)),
-                'height': int(metadata.get('height', 0)),
-            })
-
-        page_token = response.get('nextPageToken')
-        if not page_token:
-            break
+    photos = []
+    for item in _iter_pages(fetch_page, 'mediaItems'):
+        metadata = item.get('mediaMetadata', {})
+        photos.append({
+            'id': item.get('id'),
+            'filename': item.get('filename', ''),
+            'mimeType': item.get('mimeType', ''),
+            'creationTime': metadata.get('creationTime', ''),
+            'baseUrl': item.get('baseUrl'),
+            'width': int(metadata.get('width', 0)),
+            'height': int(metadata.get('height', 0)),
+        })
 
     return photos
 
 
 def get_processed_photos() -> set[str]:
-    """Get set of already processed photo IDs."""
-    data = load_json(PROCESSED_PHOTOS_FILE, {'processed': []})
-    return set(data.get('processed', []))
+    """Get set of already processed photo IDs. Do not mutate the returned set."""
+    return processed_photo_ids()
+
+
+def mark_photos_processed(photo_ids: Iterable[str]) -> None:
+    """Mark several photos as processed by appending new IDs to the log."""
+    add_processed_photo_ids(photo_ids)
 
 
 def mark_photo_processed(photo_id: str) -> None:
-    """Mark a photo as processed."""
-    data = load_json(PROCESSED_PHOTOS_FILE, {'processed': []})
-    if photo_id not in data['processed']:
-        data['processed'].append(photo_id)
-        save_json(PROCESSED_PHOTOS_FILE, data)
+    """Mark a photo as processed. Prefer mark_photos_processed for batches."""
+    mark_photos_processed([photo_id])
 
 
 def get_new_photos(album_id: str = None) -> list[dict]:
@@ -371,6 +480,23 @@ def group_photos_by_time(photos: list[dict]) -> list[list[dict]]:
     return [[photo] for photo in photos]
 
 
+def _photo_url(photo: dict, size: str = 'full') -> str:
+    """Build download URL for photo at the given size."""
+    base_url = photo.get('baseUrl')
+    if not base_url:
+        raise ValueError('Photo has no baseUrl')
+
+    # Add size parameters
+    size_params = {
+        'full': f'=w{photo.get("width", 4000)}-h{photo.get("height", 4000)}',
+        'large': '=w1600-h1600',
+        'medium': '=w800-h800',
+        'thumb': '=w256-h256',
+    }
+
+    return base_url + size_params.get(size, size_params['full'])
+
+
 def download_photo(photo: dict, size: str = 'full') -> bytes:
     """
     Download photo content.
@@ -382,20 +508,27 @@ def download_photo(photo: dict, size: str = 'full') -> bytes:
     Returns:
         Image bytes
     """
-    base_url = photo.get('baseUrl')
-    if not base_url:
-        raise ValueError('Photo has no baseUrl')
+    return download(_photo_url(photo, size), timeout=60)
 
-    # Add size parameters
-    size_params = {
-        'full': f'=w{photo.get("width", 4000)}-h{photo.get("height", 4000)}',
-        'large': '=w1600-h1600',
-        'medium': '=w800-h800',
-        'thumb': '=w256-h256',
-    }
 
-    url = base_url + size_params.get(size, size_params['full'])
-    return download(url, timeout=60)
+def download_photos(
+    photos: list[dict],
+    size: str = 'full',
+    max_workers: int = PHOTO_DOWNLOAD_WORKERS,
+) -> list[bytes]:
+    """
+    Download several photos concurrently over the shared HTTP session.
+
+    Returns image bytes in the same order as photos.
+    Raises the first download error encountered.
+    """
+    if not photos:
+        return []
+
+    workers = min(max_workers, len(photos))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda photo: download_photo(photo, size), photos))
 
 
 def download_photo_to_file(photo: dict, output_path: Path, size: str = 'full') -> Path:
@@ -403,6 +536,10 @@ def download_photo_to_file(photo: dict, output_path: Path, size: str = 'full') -
     output_path = Path(output_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
 
+    # Full-size images are streamed to disk rather than buffered in memory
+    if size == 'full':
+        return download_to_file(_photo_url(photo, size), output_path, timeout=60)
+
     image_data = download_photo(photo, size)
 
     with open(output_path, 'wb') as f:
@@ -442,10 +579,11 @@ if __name__ == '__main__':
 
     # Test processed photos tracking
     from storage import delete_file
-    test_processed_file = PROCESSED_PHOTOS_FILE
+    test_processed_file = PROCESSED_PHOTOS_LOG_FILE
 
     # Clean state
     delete_file(test_processed_file)
+    delete_file(PROCESSED_PHOTOS_FILE)
 
     processed = get_processed_photos()
     assert len(processed) == 0, 'Should start empty'
@@ -463,6 +601,11 @@ if __name__ == '__main__':
     processed = get_processed_photos()
     assert len(processed) == 2, 'Should not duplicate'
 
+    # Batch marking (mixes new and already processed IDs)
+    mark_photos_processed(['test-photo-2', 'test-photo-3', 'test-photo-4'])
+    processed = get_processed_photos()
+    assert len(processed) == 4, 'Batch should add only new photos'
+
     # Cleanup
     delete_file(test_processed_file)
     print('[OK] Processed photos tracking')
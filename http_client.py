@@ -1,14 +1,35 @@
 #!/usr/bin/env python3
 """HTTP client with retry and timeout for payme."""
 
+import os
+import random
+import shutil
+import threading
 import time
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from tempfile import NamedTemporaryFile
 from typing import Any, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, Timeout, ConnectionError, HTTPError
+from urllib3.exceptions import HTTPError as Urllib3Error
 
 from config import HTTP_TIMEOUT_SECONDS, HTTP_RETRY_ATTEMPTS
 
+# Upper bound on a server-requested Retry-After wait (seconds)
+RETRY_AFTER_MAX_SECONDS = 60
+
+# Buffer size for streaming downloads to disk
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Shared keep-alive session: reuses TCP/TLS connections across requests
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(pool_connections=10, pool_maxsize=20)
+_SESSION.mount('https://', _ADAPTER)
+_SESSION.mount('http://', _ADAPTER)
+
 
 class HttpError(Exception):
     """HTTP request failed after all retries."""
@@ -25,6 +46,41 @@ def _calculate_backoff(attempt: int, base: float = 1.0, max_delay: float = 30.0)
     return min(delay, max_delay)
 
 
+def _parse_retry_after(response: requests.Response) -> Optional[float]:
+    """
+    Parse Retry-After header (delay in seconds or HTTP-date).
+
+    Returns seconds to wait, or None if the header is missing or invalid.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def _retry_delay(attempt: int, response: requests.Response = None) -> float:
+    """
+    Delay before the next attempt: exponential backoff, raised to the
+    server's Retry-After (capped) if given, plus up to 30% random jitter.
+    """
+    delay = _calculate_backoff(attempt)
+    if response is not None:
+        retry_after = _parse_retry_after(response)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, RETRY_AFTER_MAX_SECONDS))
+    return delay + random.uniform(0, 0.3 * delay)
+
+
 def _should_retry(status_code: int) -> bool:
     """Determine if request should be retried based on status code."""
     # Retry on server errors and rate limiting
@@ -41,6 +97,7 @@ def request(
     timeout: float = None,
     retries: int = None,
     raise_for_status: bool = True,
+    stream: bool = False,
 ) -> requests.Response:
     """
     Make HTTP request with retry and exponential backoff.
@@ -55,6 +112,7 @@ def request(
         timeout: Request timeout in seconds (default: HTTP_TIMEOUT_SECONDS)
         retries: Number of retry attempts (default: HTTP_RETRY_ATTEMPTS)
         raise_for_status: Raise HttpError on 4xx/5xx responses (default: True)
+        stream: Defer downloading the response body (default: False)
 
     Returns:
         requests.Response object
@@ -72,7 +130,7 @@ def request(
 
     for attempt in range(retries):
         try:
-            response = requests.request(
+            response = _SESSION.request(
                 method=method,
                 url=url,
                 headers=headers,
@@ -80,13 +138,16 @@ def request(
                 json=json,
                 data=data,
                 timeout=timeout,
+                stream=stream,
             )
 
             # Check if we should retry based on status code
             if response.status_code >= 400 and _should_retry(response.status_code):
                 last_response = response
                 if attempt < retries - 1:
-                    delay = _calculate_backoff(attempt)
+                    delay = _retry_delay(attempt, response)
+                    # Hand a streamed response's connection back before retrying
+                    response.close()
                     time.sleep(delay)
                     continue
 
@@ -103,8 +164,7 @@ def request(
         except (Timeout, ConnectionError) as e:
             last_exception = e
             if attempt < retries - 1:
-                delay = _calculate_backoff(attempt)
-                time.sleep(delay)
+                time.sleep(_retry_delay(attempt))
                 continue
 
         except RequestException as e:
@@ -208,6 +268,66 @@ def download(
     return response.content
 
 
+def download_to_file(
+    url: str,
+    output_path: Path,
+    headers: dict = None,
+    timeout: float = None,
+    retries: int = None,
+) -> Path:
+    """
+    Stream binary content from URL straight to a file.
+
+    The body is copied in DOWNLOAD_CHUNK_SIZE chunks, never held in memory
+    as a whole, into a temp file that replaces output_path only once the
+    download is complete. Returns output path.
+
+    Raises:
+        HttpError: On request failure, including errors mid-body
+    """
+    output_path = Path(output_path)
+    response = request('GET', url, headers=headers, timeout=timeout, retries=retries, stream=True)
+
+    tmp_path = None
+    try:
+        with response, NamedTemporaryFile(
+            mode='wb',
+            suffix='.part',
+            dir=output_path.parent,
+            delete=False,
+        ) as f:
+            tmp_path = f.name
+            response.raw.decode_content = True
+            shutil.copyfileobj(response.raw, f, DOWNLOAD_CHUNK_SIZE)
+        os.replace(tmp_path, output_path)
+    except BaseException as e:
+        if tmp_path is not None:
+            Path(tmp_path).unlink(missing_ok=True)
+        if isinstance(e, (RequestException, Urllib3Error)):
+            raise HttpError(f'Download failed: {e}') from e
+        raise
+
+    return output_path
+
+
+def warm_up(url: str, headers: dict = None, timeout: float = 5) -> threading.Thread:
+    """
+    Open a pooled keep-alive connection to url in the background.
+
+    Sends a single HEAD request and ignores the outcome; later requests
+    to the same host skip the TCP/TLS handshake. Returns the thread.
+    """
+    def _head():
+        try:
+            _SESSION.head(url, headers=headers, timeout=timeout).close()
+        except RequestException:
+            pass
+
+    thread = threading.Thread(target=_head, daemon=True)
+    thread.start()
+    return thread
+
+
 if __name__ == '__main__':
     print('Testing http_client.py')
     print('=' * 40)
@@ -263,5 +383,16 @@ if __name__ == '__main__':
     assert _calculate_backoff(10) == 30.0, 'Backoff max failed'
     print('[OK] Backoff calculation')
 
+    # Test Retry-After parsing
+    retry_response = requests.Response()
+    retry_response.headers['Retry-After'] = '7'
+    assert _parse_retry_after(retry_response) == 7.0, 'Retry-After seconds failed'
+    assert 7.0 <= _retry_delay(0, retry_response) <= 7.0 * 1.3, 'Retry-After delay failed'
+    retry_response.headers['Retry-After'] = 'Wed, 21 Oct 2015 07:28:00 GMT'
+    assert _parse_retry_after(retry_response) == 0.0, 'Past Retry-After date failed'
+    retry_response.headers['Retry-After'] = 'soon'
+    assert _parse_retry_after(retry_response) is None, 'Invalid Retry-After failed'
+    print('[OK] Retry-After parsing')
+
     print('=' * 40)
     print('All tests passed')
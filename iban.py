@@ -2,11 +2,15 @@
 """IBAN validation and bank lookup for payme."""
 
 import re
+import threading
 import requests
+from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
 from typing import Optional
 
 from config import BIC_DB_FILE, BIC_CACHE_FILE, OPENIBAN_API_BASE
-from storage import load_json, update_dict
+from storage import load_json, save_json
 
 # IBAN length by country (common European countries)
 IBAN_LENGTHS = {
@@ -15,10 +19,29 @@ IBAN_LENGTHS = {
     'GB': 22, 'IE': 22, 'DK': 18, 'SE': 24, 'NO': 15, 'FI': 18,
 }
 
+# Failed API lookups are remembered for this long before retrying
+NEGATIVE_CACHE_HOURS = 24
+
+# In-memory BIC database and lookup cache, each with the file mtime it was
+# loaded at; reloaded only if the file changes on disk
+_STORE = {'db': None, 'db_mtime': None, 'cache': None, 'cache_mtime': None}
+_STORE_LOCK = threading.Lock()
+
+# Country code, check digits, then alphanumeric BBAN
+_IBAN_RE = re.compile(r'^[A-Z]{2}[0-9]{2}[A-Z0-9]+$')
+
+# Mod-97 value per ASCII code: digits 0-9, letters A=10, B=11, ..., Z=35
+_CHAR_VAL = [0] * 128
+for _c in range(10):
+    _CHAR_VAL[ord('0') + _c] = _c
+for _c in range(26):
+    _CHAR_VAL[ord('A') + _c] = _c + 10
+del _c
+
 
 def normalize_iban(iban: str) -> str:
     """Remove spaces and convert to uppercase."""
-    return re.sub(r'\s+', '', iban).upper()
+    return ''.join(iban.split()).upper()
 
 
 def validate_iban(iban: str) -> tuple[bool, str]:
@@ -26,13 +49,24 @@ def validate_iban(iban: str) -> tuple[bool, str]:
     Validate IBAN using ISO 7064 Mod 97-10 checksum.
     Returns (is_valid, error_message).
     """
-    iban = normalize_iban(iban)
+    return _validate_normalized(normalize_iban(iban))
+
 
+# Pure and returns an immutable tuple, so recurring payees skip the checksum.
+# Bank lookups are not memoized here: _bank_store already keeps them in memory
+# and must see BIC file changes and expiring failed lookups.
+@lru_cache(maxsize=1024)
+def _validate_normalized(iban: str) -> tuple[bool, str]:
+    """validate_iban for an already normalized IBAN."""
     # Basic format check
     if not iban:
         return False, 'IBAN is empty'
 
-    if not re.match(r'^[A-Z]{2}[0-9]{2}[A-Z0-9]+$', iban):
+    # Cheap character-class test first: most garbage fails here without the regex
+    if len(iban) < 5 or not (iban[:2].isalpha() and iban[2:4].isdigit()):
+        return False, 'Invalid IBAN format'
+
+    if not _IBAN_RE.match(iban):
         return False, 'Invalid IBAN format'
 
     country_code = iban[:2]
@@ -45,22 +79,31 @@ def validate_iban(iban: str) -> tuple[bool, str]:
     elif len(iban) < 15 or len(iban) > 34:
         return False, f'Invalid IBAN length: {len(iban)}'
 
+    if not _checksum_ok(iban):
+        return False, 'Invalid IBAN checksum'
+
+    return True, ''
+
+
+def _checksum_ok(iban: str) -> bool:
+    """Mod 97-10 check for a normalized IBAN that passed the format check."""
     # Move first 4 characters to end
     rearranged = iban[4:] + iban[:4]
 
-    # Convert letters to numbers (A=10, B=11, ..., Z=35)
-    numeric = ''
+    # Check mod 97 incrementally; letters expand to two digits (A=10, ..., Z=35)
+    remainder = 0
     for char in rearranged:
-        if char.isalpha():
-            numeric += str(ord(char) - ord('A') + 10)
-        else:
-            numeric += char
+        value = _CHAR_VAL[ord(char)]
+        remainder = (remainder * (100 if value >= 10 else 10) + value) % 97
 
-    # Check mod 97
-    if int(numeric) % 97 != 1:
-        return False, 'Invalid IBAN checksum'
+    return remainder == 1
 
-    return True, ''
+
+# Compiled drop-in for _checksum_ok, used when iban_fast.pyx is built
+try:
+    from iban_fast import _checksum_ok
+except ImportError:
+    pass
 
 
 def extract_country_code(iban: str) -> str:
@@ -70,7 +113,11 @@ def extract_country_code(iban: str) -> str:
 
 def extract_blz(iban: str) -> Optional[str]:
     """Extract German Bankleitzahl (BLZ) from IBAN. Returns None for non-DE IBANs."""
-    iban = normalize_iban(iban)
+    return _extract_blz_normalized(normalize_iban(iban))
+
+
+def _extract_blz_normalized(iban: str) -> Optional[str]:
+    """extract_blz for an already normalized IBAN."""
     if not iban.startswith('DE') or len(iban) != 22:
         return None
     # German IBAN: DExx BBBB BBBB CCCC CCCC CC
@@ -78,21 +125,72 @@ def extract_blz(iban: str) -> Optional[str]:
     return iban[4:12]
 
 
+def _mtime(path: Path) -> Optional[int]:
+    """File modification time in ns, or None if the file is missing."""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _bank_store() -> dict:
+    """Return _STORE with db and cache loaded, re-reading only changed files."""
+    with _STORE_LOCK:
+        return _refresh_store()
+
+
+def _refresh_store() -> dict:
+    """_bank_store body; the caller holds _STORE_LOCK."""
+    db_mtime = _mtime(BIC_DB_FILE)
+    if _STORE['db'] is None or db_mtime != _STORE['db_mtime']:
+        _STORE['db'] = load_json(BIC_DB_FILE, {})
+        _STORE['db_mtime'] = db_mtime
+
+    cache_mtime = _mtime(BIC_CACHE_FILE)
+    if _STORE['cache'] is None or cache_mtime != _STORE['cache_mtime']:
+        _STORE['cache'] = load_json(BIC_CACHE_FILE, {})
+        _STORE['cache_mtime'] = cache_mtime
+
+    return _STORE
+
+
 def lookup_bank_from_db(blz: str) -> Optional[dict]:
     """Look up bank info from local BIC database."""
-    bic_db = load_json(BIC_DB_FILE, {})
-    return bic_db.get(blz)
+    return _bank_store()['db'].get(blz)
 
 
 def lookup_bank_from_cache(iban: str) -> Optional[dict]:
-    """Look up bank info from cache."""
-    cache = load_json(BIC_CACHE_FILE, {})
-    return cache.get(normalize_iban(iban))
+    """
+    Look up bank info from cache.
 
+    Returns the cache entry, or None if not cached. Entries with
+    found=False are failed lookups; they expire after NEGATIVE_CACHE_HOURS.
+    """
+    entry = _bank_store()['cache'].get(normalize_iban(iban))
+    if not entry or entry.get('found', True):
+        return entry
 
-def cache_bank_lookup(iban: str, info: dict) -> None:
-    """Cache bank lookup result."""
-    update_dict(BIC_CACHE_FILE, normalize_iban(iban), info)
+    looked_up_at = entry.get('looked_up_at')
+    if not looked_up_at:
+        return None
+    if datetime.now() - datetime.fromisoformat(looked_up_at) > timedelta(hours=NEGATIVE_CACHE_HOURS):
+        return None
+    return entry
+
+
+def cache_bank_lookup(iban: str, info: Optional[dict]) -> None:
+    """Cache bank lookup result. Pass None to remember a failed lookup."""
+    entry = {**info, 'found': True} if info else {'found': False}
+    entry['looked_up_at'] = datetime.now().isoformat()
+
+    # Write through: update the in-memory cache and the file together.
+    # Polls look up banks from several threads, so the change, the save
+    # (which walks the dict) and any reload are serialized.
+    with _STORE_LOCK:
+        store = _refresh_store()
+        store['cache'][normalize_iban(iban)] = entry
+        save_json(BIC_CACHE_FILE, store['cache'])
+        store['cache_mtime'] = _mtime(BIC_CACHE_FILE)
 
 
 def lookup_bank_from_api(iban: str) -> Optional[dict]:
@@ -130,16 +228,19 @@ def lookup_bank(iban: str) -> dict:
 
     Lookup order:
     1. Local BIC database (for German IBANs via BLZ)
-    2. Cache (for previously looked up IBANs)
+    2. Cache (for previously looked up IBANs, incl. recent failures)
     3. openiban.com API (3s timeout)
     4. Returns unknown bank info if all fail
 
     Returns dict with keys: name, bic, city, source
     """
-    iban = normalize_iban(iban)
+    return _lookup_bank_normalized(normalize_iban(iban))
 
+
+def _lookup_bank_normalized(iban: str) -> dict:
+    """lookup_bank for an already normalized IBAN."""
     # For German IBANs, try local BLZ database first
-    blz = extract_blz(iban)
+    blz = _extract_blz_normalized(iban)
     if blz:
         db_result = lookup_bank_from_db(blz)
         if db_result:
@@ -150,18 +251,23 @@ def lookup_bank(iban: str) -> dict:
                 'source': 'bic_db',
             }
 
-    # Check cache
+    # Check cache (a recent failed lookup skips the API)
     cached = lookup_bank_from_cache(iban)
-    if cached:
-        cached['source'] = 'cache'
-        return cached
-
-    # Try openiban.com API
-    api_result = lookup_bank_from_api(iban)
-    if api_result:
+    if cached is not None:
+        if cached.get('found', True):
+            return {
+                'name': cached.get('name', ''),
+                'bic': cached.get('bic', ''),
+                'city': cached.get('city', ''),
+                'source': 'cache',
+            }
+    else:
+        # Try openiban.com API
+        api_result = lookup_bank_from_api(iban)
         cache_bank_lookup(iban, api_result)
-        api_result['source'] = 'openiban'
-        return api_result
+        if api_result:
+            api_result['source'] = 'openiban'
+            return api_result
 
     # All lookups failed
     return {
@@ -183,18 +289,19 @@ def get_iban_info(iban: str) -> dict:
     - country: country code
     - bank: dict with name, bic, city, source
     """
+    # Normalize once; the helpers below expect normalized input
     iban = normalize_iban(iban)
-    is_valid, error = validate_iban(iban)
+    is_valid, error = _validate_normalized(iban)
 
     result = {
         'iban': iban,
         'valid': is_valid,
         'error': error,
-        'country': extract_country_code(iban) if iban else '',
+        'country': iban[:2],
     }
 
     if is_valid:
-        result['bank'] = lookup_bank(iban)
+        result['bank'] = _lookup_bank_normalized(iban)
     else:
         result['bank'] = {'name': '', 'bic': '', 'city': '', 'source': 'none'}
 
@@ -0,0 +1,33 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Optional compiled IBAN checksum for iban.py.
+
+Build in place next to iban.py (needs Cython and a C compiler):
+
+    cythonize -i iban_fast.pyx
+
+iban.py falls back to its pure-Python _checksum_ok when the extension
+is not built.
+"""
+
+
+cpdef bint _checksum_ok(str iban):
+    """
+    Mod 97-10 check for a normalized IBAN that passed the format check.
+
+    Same result as iban._checksum_ok: the first 4 characters are moved to
+    the end, letters count as two digits (A=10, ..., Z=35).
+    """
+    cdef Py_ssize_t n = len(iban)
+    cdef Py_ssize_t i
+    cdef Py_UCS4 c
+    cdef int remainder = 0
+
+    for i in range(n):
+        c = iban[(i + 4) % n]
+        if c <= u'9':
+            remainder = (remainder * 10 + (<int>c - <int>u'0')) % 97
+        else:
+            remainder = (remainder * 100 + (<int>c - <int>u'A' + 10)) % 97
+
+    return remainder == 1
@@ -1,61 +1,153 @@
 #!/usr/bin/env python3
 """Interactive script to manage processed bills."""
 
+import re
+import sys
+from bisect import bisect_left
 from datetime import datetime, timedelta
-
-from config import PAYMENT_HISTORY_FILE, PROCESSED_PHOTOS_FILE, PROCESSED_EMAILS_FILE
-from storage import load_json, save_json
+from operator import methodcaller
+
+from config import PAYMENT_HISTORY_FILE, PROCESSED_EMAILS_FILE
+from storage import load_json_cached, peek_json_cached, save_json
+from google_drive import unmark_photos_processed
+from gemini import evict_cached_responses
+
+# ijson is optional: streams the history so only bills in range are kept
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# One selection token: a bill number or an inclusive range like '3-5'
+_SELECTION_RE = re.compile(r'(\d+)(?:-(\d+))?')
+
+# b.get('id') as a C-level callable, for building ID sets with map()
+_bill_id = methodcaller('get', 'id')
+
+# Sort/filter key: ISO creation time, which sorts chronologically as a string
+_created_at = methodcaller('get', 'created_at', '')
+
+# location -> (source list, sorted created_at keys, bills in that order)
+_CREATED_INDEX = {}
+
+# ijson prefix of each bill in the history document -> its list
+_ITEM_LOCATIONS = {'pending.item': 'pending', 'history.item': 'history'}
+
+
+def _created_index(location):
+    """
+    Bills in the 'pending' or 'history' list ordered by creation time.
+
+    Returns (keys, bills) with keys[i] == _created_at(bills[i]). Rebuilt
+    only when the cached history document changes.
+    """
+    bills = load_json_cached(PAYMENT_HISTORY_FILE, {}).get(location, [])
+    cached = _CREATED_INDEX.get(location)
+    if cached is None or cached[0] is not bills:
+        # History is appended in time order, so this sort is near-linear
+        ordered = sorted(bills, key=_created_at)
+        cached = (bills, list(map(_created_at, ordered)), ordered)
+        _CREATED_INDEX[location] = cached
+    return cached[1], cached[2]
+
+
+def _indexed_bills_since(cutoff):
+    """(location, bill) pairs created at or after cutoff, from the cached document."""
+    pairs = []
+    for location in ('pending', 'history'):
+        keys, ordered = _created_index(location)
+        pairs.extend((location, b) for b in ordered[bisect_left(keys, cutoff):])
+    return pairs
+
+
+def _streamed_bills_since(cutoff):
+    """
+    (location, bill) pairs created at or after cutoff, streamed in one pass.
+
+    Only bills in range are kept as dicts. A corrupt or truncated file
+    yields no bills (with a warning) rather than a silently partial list.
+    """
+    pairs = []
+    builder = None
+    try:
+        with open(PAYMENT_HISTORY_FILE, 'rb') as f:
+            for prefix, event, value in ijson.parse(f, use_float=True):
+                if builder is not None:
+                    if event == 'end_map' and prefix == item_prefix:
+                        bill = builder.value
+                        builder = None
+                        if _created_at(bill) >= cutoff:
+                            pairs.append((_ITEM_LOCATIONS[item_prefix], bill))
+                    else:
+                        builder.event(event, value)
+                elif event == 'start_map' and prefix in _ITEM_LOCATIONS:
+                    item_prefix = prefix
+                    builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+    except FileNotFoundError:
+        return []
+    except ijson.JSONError as e:
+        print(f'Warning: cannot read {PAYMENT_HISTORY_FILE}: {e}', file=sys.stderr)
+        return []
+    return pairs
 
 
 def get_bills_in_range(days):
     """Get all bills created within the last N days."""
-    data = load_json(PAYMENT_HISTORY_FILE, {})
     cutoff = (datetime.now() - timedelta(days=days)).isoformat()
 
-    bills = []
-    for b in data.get('pending', []):
-        if b.get('created_at', '') >= cutoff:
-            b['_location'] = 'pending'
-            bills.append(b)
-
-    for b in data.get('history', []):
-        if b.get('created_at', '') >= cutoff:
-            b['_location'] = 'history'
-            bills.append(b)
+    # Reuse the parsed document when a delete/reprocess already loaded it
+    if ijson is None or peek_json_cached(PAYMENT_HISTORY_FILE) is not None:
+        pairs = _indexed_bills_since(cutoff)
+    else:
+        pairs = _streamed_bills_since(cutoff)
 
-    bills.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+    bills = [{**b, '_location': location} for location, b in pairs]
+    bills.sort(key=_created_at, reverse=True)
     return bills
 
 
 def display_bills(bills):
     """Display bills in numbered list."""
-    print()
-    print('=' * 70)
-    print(f'{"#":<4} {"Status":<12} {"Amount":>10} {"Due Date":<12} {"Vendor":<30}')
-    print('=' * 70)
-
-    for i, b in enumerate(bills, 1):
-        status = b.get('status', 'unknown')
-        amount = f"{b.get('amount', 0):.2f}"
-        due = b.get('due_date', '')[:10] or 'N/A'
-        vendor = b.get('recipient', 'Unknown')[:30]
-        print(f'{i:<4} {status:<12} {amount:>10} {due:<12} {vendor:<30}')
-
-    print('=' * 70)
-    print()
+    rule = '=' * 70
+    lines = [
+        '',
+        rule,
+        f'{"#":<4} {"Status":<12} {"Amount":>10} {"Due Date":<12} {"Vendor":<30}',
+        rule,
+    ]
+    lines.extend(
+        f'{i:<4} {b.get("status", "unknown"):<12} {b.get("amount", 0):>10.2f} '
+        f'{b.get("due_date", "")[:10] or "N/A":<12} {b.get("recipient", "Unknown")[:30]:<30}'
+        for i, b in enumerate(bills, 1)
+    )
+    lines.extend((rule, ''))
+
+    # One write for the whole table instead of a print per row
+    print('\n'.join(lines))
+
+
+def _without_bills(data, bill_ids):
+    """Copy of history data with bill_ids dropped from pending and history (one pass each)."""
+    result = dict(data)
+    for key in ('pending', 'history'):
+        kept = []
+        append = kept.append
+        for b in data.get(key, []):
+            if b.get('id') not in bill_ids:
+                append(b)
+        result[key] = kept
+    return result
 
 
 def delete_bills(bills, indices):
     """Delete bills by their indices."""
-    data = load_json(PAYMENT_HISTORY_FILE, {})
+    data = load_json_cached(PAYMENT_HISTORY_FILE, {})
 
     to_delete = [bills[i] for i in indices]
-    deleted_ids = {b.get('id') for b in to_delete}
+    deleted_ids = set(map(_bill_id, to_delete))
 
-    data['pending'] = [b for b in data.get('pending', []) if b.get('id') not in deleted_ids]
-    data['history'] = [b for b in data.get('history', []) if b.get('id') not in deleted_ids]
-
-    save_json(PAYMENT_HISTORY_FILE, data)
+    save_json(PAYMENT_HISTORY_FILE, _without_bills(data, deleted_ids))
 
     print(f'Deleted {len(to_delete)} bill(s).')
     return to_delete
@@ -66,29 +158,26 @@ def reprocess_bills(bills, indices):
     to_reprocess = [bills[i] for i in indices]
 
     # Collect photo IDs to remove
-    photo_ids_to_remove = set()
-    for b in to_reprocess:
-        for pid in b.get('photo_ids', []):
-            photo_ids_to_remove.add(pid)
+    photo_ids_to_remove = {pid for b in to_reprocess for pid in b.get('photo_ids', [])}
 
-    # Remove from processed_photos.json
+    # Remove from processed photos log
     if photo_ids_to_remove:
-        photos_data = load_json(PROCESSED_PHOTOS_FILE, {})
-        processed = photos_data.get('processed', [])
-        original_count = len(processed)
-        processed = [p for p in processed if p not in photo_ids_to_remove]
-        photos_data['processed'] = processed
-        save_json(PROCESSED_PHOTOS_FILE, photos_data)
-        removed = original_count - len(processed)
+        removed = unmark_photos_processed(photo_ids_to_remove)
         if removed > 0:
             print(f'Removed {removed} photo ID(s) from processed list.')
 
+    # Forget the Gemini responses, so the next poll parses the pages afresh
+    # instead of replaying the cached (possibly wrong) result
+    cache_keys = {b['ocr_cache_key'] for b in to_reprocess if b.get('ocr_cache_key')}
+    if cache_keys:
+        evicted = evict_cached_responses(cache_keys)
+        if evicted > 0:
+            print(f'Cleared {evicted} cached OCR result(s).')
+
     # Also delete the bills from history so they don't show as duplicates
-    data = load_json(PAYMENT_HISTORY_FILE, {})
-    bill_ids_to_remove = {b.get('id') for b in to_reprocess}
-    data['pending'] = [b for b in data.get('pending', []) if b.get('id') not in bill_ids_to_remove]
-    data['history'] = [b for b in data.get('history', []) if b.get('id') not in bill_ids_to_remove]
-    save_json(PAYMENT_HISTORY_FILE, data)
+    data = load_json_cached(PAYMENT_HISTORY_FILE, {})
+    bill_ids_to_remove = set(map(_bill_id, to_reprocess))
+    save_json(PAYMENT_HISTORY_FILE, _without_bills(data, bill_ids_to_remove))
 
     print(f'Marked {len(to_reprocess)} bill(s) for reprocessing.')
     print('Run a poll to pick them up again.')
@@ -96,29 +185,29 @@ def reprocess_bills(bills, indices):
 
 def parse_selection(input_str, max_num):
     """Parse user input like '1,3,5' or '1-3' or '1,3-5' into list of indices."""
-    indices = set()
-    parts = input_str.replace(' ', '').split(',')
-
-    for part in parts:
-        if not part:
+    # Clamped 0-based [start, stop) spans; sorting spans instead of indices
+    # Spaces are ignored and each comma-separated token must match whole;
+    # anything malformed ('1-3-5', '3.5', '1a') selects nothing
+    spans = []
+    for part in input_str.replace(' ', '').split(','):
+        m = _SELECTION_RE.fullmatch(part)
+        if m is None:
             continue
-        if '-' in part:
-            try:
-                start, end = part.split('-')
-                for i in range(int(start), int(end) + 1):
-                    if 1 <= i <= max_num:
-                        indices.add(i - 1)
-            except ValueError:
-                pass
-        else:
-            try:
-                i = int(part)
-                if 1 <= i <= max_num:
-                    indices.add(i - 1)
-            except ValueError:
-                pass
-
-    return sorted(indices)
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else start
+        spans.append((max(start, 1) - 1, min(end, max_num)))
+    spans.sort()
+
+    # Merge overlapping spans while emitting indices in order
+    indices = []
+    emitted = 0
+    for start, stop in spans:
+        start = max(start, emitted)
+        if start < stop:
+            indices.extend(range(start, stop))
+            emitted = stop
+
+    return indices
 
 
 def main():
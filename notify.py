@@ -1,17 +1,52 @@
 #!/usr/bin/env python3
 """Home Assistant notification calls for payme."""
 
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from string import ascii_lowercase, ascii_uppercase
 
 from config import get_env
-from http_client import post_json, HttpError
-from formatting import format_currency, format_iban
+from http_client import post_json, warm_up, HttpError
+from formatting import format_currency
 
 # HA API endpoints
 HA_API_BASE = 'http://supervisor/core/api'  # Inside HA container
 HA_API_FALLBACK = 'http://localhost:8123/api'  # External access
 
-
+# PAYME_QUIET values that turn quiet mode on (anything else, e.g. '0', is off)
+_TRUTHY_VALUES = frozenset({'1', 'true', 'yes', 'on'})
+
+# Uppercases and drops spaces in one pass (IBANs are ASCII)
+_IBAN_MASK_TABLE = str.maketrans(ascii_lowercase, ascii_uppercase, ' ')
+
+# Static notification data, built once at import (never mutated)
+_PENDING_BILL_DATA = {
+    'group': 'payme_bills',
+    # iOS specific
+    'push': {
+        'category': 'payme_bill',
+    },
+    # Android specific
+    'channel': 'payme_bills',
+    'importance': 'high',
+    'sticky': True,
+}
+_OPEN_WISE_ACTIONS = [
+    {
+        'action': 'URI',
+        'title': 'Open Wise',
+        'uri': 'wise://',
+    },
+]
+_PAYMENT_SENT_DATA = {'tag': 'payme_payment_sent', 'group': 'payme_status'}
+_PAYMENT_REJECTED_DATA = {'tag': 'payme_payment_rejected', 'group': 'payme_status'}
+_BALANCE_DATA = {'tag': 'payme_balance', 'group': 'payme_status', 'importance': 'high'}
+_PARSE_ERROR_DATA = {'tag': 'payme_parse_error', 'group': 'payme_errors'}
+_GOOGLE_AUTH_DATA = {'tag': 'payme_google_auth', 'group': 'payme_status', 'importance': 'high'}
+_POLL_COMPLETE_DATA = {'tag': 'payme_poll', 'group': 'payme_status', 'importance': 'low'}
+
+
+@lru_cache(maxsize=1)
 def get_ha_token() -> str:
     """Get Home Assistant long-lived access token."""
     # Inside HA, SUPERVISOR_TOKEN is available
@@ -23,6 +58,7 @@ def get_ha_token() -> str:
     return get_env('PAYME_HA_TOKEN', required=True)
 
 
+@lru_cache(maxsize=1)
 def get_ha_api_base() -> str:
     """Get HA API base URL."""
     # Check if running inside HA
@@ -31,11 +67,38 @@ def get_ha_api_base() -> str:
     return get_env('PAYME_HA_API_URL', HA_API_FALLBACK)
 
 
+@lru_cache(maxsize=1)
 def get_notify_service() -> str:
     """Get notification service name."""
     return get_env('PAYME_NOTIFY_SERVICE', 'mobile_app_phone')
 
 
+@lru_cache(maxsize=1)
+def is_quiet() -> bool:
+    """True if PAYME_QUIET is truthy: HA calls are skipped (dev/test runs)."""
+    return get_env('PAYME_QUIET', '').strip().lower() in _TRUTHY_VALUES
+
+
+@lru_cache(maxsize=1)
+def _headers() -> dict:
+    """Request headers for HA API calls (built once; do not mutate)."""
+    return {
+        'Authorization': f'Bearer {get_ha_token()}',
+        'Content-Type': 'application/json',
+    }
+
+
+@lru_cache(maxsize=1)
+def warm_up_ha_connection() -> None:
+    """Open the HA API connection in the background (once per process)."""
+    if is_quiet():
+        return
+    try:
+        warm_up(f'{get_ha_api_base()}/', headers=_headers())
+    except EnvironmentError:
+        pass  # No HA token configured; notifications will fail on their own
+
+
 def call_ha_service(domain: str, service: str, data: dict) -> dict:
     """
     Call a Home Assistant service.
@@ -49,12 +112,7 @@ def call_ha_service(domain: str, service: str, data: dict) -> dict:
         Response dict
     """
     url = f'{get_ha_api_base()}/services/{domain}/{service}'
-    headers = {
-        'Authorization': f'Bearer {get_ha_token()}',
-        'Content-Type': 'application/json',
-    }
-
-    return post_json(url, headers=headers, json=data, timeout=10)
+    return post_json(url, headers=_headers(), json=data, timeout=10)
 
 
 def send_notification(
@@ -73,8 +131,11 @@ def send_notification(
         service: Override notification service name
 
     Returns:
-        True if sent successfully
+        True if sent successfully (or skipped in quiet mode)
     """
+    if is_quiet():
+        return True
+
     if service is None:
         service = get_notify_service()
 
@@ -106,8 +167,11 @@ def send_persistent_notification(
         notification_id: Optional ID for updating/dismissing
 
     Returns:
-        True if created successfully
+        True if created successfully (or skipped in quiet mode)
     """
+    if is_quiet():
+        return True
+
     payload = {
         'title': title,
         'message': message,
@@ -124,6 +188,9 @@ def send_persistent_notification(
 
 def dismiss_persistent_notification(notification_id: str) -> bool:
     """Dismiss a persistent notification by ID."""
+    if is_quiet():
+        return True
+
     try:
         call_ha_service('persistent_notification', 'dismiss', {
             'notification_id': notification_id,
@@ -133,11 +200,46 @@ def dismiss_persistent_notification(notification_id: str) -> bool:
         return False
 
 
+def send_both(
+    title: str,
+    message: str,
+    data: dict,
+    notification_id: str,
+    persistent_message: str = None,
+) -> bool:
+    """
+    Send a push notification and a persistent notification in parallel.
+
+    Args:
+        title: Title for both notifications
+        message: Push notification body
+        data: Push notification data
+        notification_id: Persistent notification ID
+        persistent_message: Persistent body (defaults to message)
+
+    Returns:
+        True if the push notification was sent. A failed persistent
+        notification is not reported, as before send_both existed; errors
+        other than HttpError (e.g. a missing token) are raised from either.
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        persistent = executor.submit(
+            send_persistent_notification,
+            title,
+            persistent_message or message,
+            notification_id,
+        )
+        sent = executor.submit(send_notification, title, message, data)
+    persistent.result()
+    return sent.result()
+
+
 def mask_iban(iban: str) -> str:
     """Mask IBAN for display, showing only first 4 and last 4 chars."""
-    iban = iban.replace(' ', '').upper()
+    iban = iban.translate(_IBAN_MASK_TABLE)
     if len(iban) <= 8:
         return iban
+    # Single f-string: faster than ''.join of the three pieces on CPython 3.11
     return f'{iban[:4]}...{iban[-4:]}'
 
 
@@ -169,6 +271,7 @@ def notify_pending_bill(
         message += f'\n⚠️ Low confidence: {confidence:.0%}'
 
     data = {
+        **_PENDING_BILL_DATA,
         'actions': [
             {
                 'action': f'PAYME_APPROVE_{bill_id}',
@@ -184,15 +287,6 @@ def notify_pending_bill(
             },
         ],
         'tag': f'payme_bill_{bill_id}',
-        'group': 'payme_bills',
-        # iOS specific
-        'push': {
-            'category': 'payme_bill',
-        },
-        # Android specific
-        'channel': 'payme_bills',
-        'importance': 'high',
-        'sticky': True,
     }
 
     return send_notification(title, message, data)
@@ -211,12 +305,7 @@ def notify_payment_sent(
         f'Ref: {reference[:50]}'
     )
 
-    data = {
-        'tag': 'payme_payment_sent',
-        'group': 'payme_status',
-    }
-
-    return send_notification(title, message, data)
+    return send_notification(title, message, _PAYMENT_SENT_DATA)
 
 
 def notify_payment_rejected(
@@ -228,12 +317,7 @@ def notify_payment_rejected(
     title = '✗ Payment Rejected'
     message = f'{format_currency(amount, currency)} to {recipient}'
 
-    data = {
-        'tag': 'payme_payment_rejected',
-        'group': 'payme_status',
-    }
-
-    return send_notification(title, message, data)
+    return send_notification(title, message, _PAYMENT_REJECTED_DATA)
 
 
 def notify_insufficient_balance(
@@ -249,20 +333,8 @@ def notify_insufficient_balance(
         f'Please top up your Wise account.'
     )
 
-    data = {
-        'tag': 'payme_balance',
-        'group': 'payme_status',
-        'importance': 'high',
-    }
-
     # Also create persistent notification
-    send_persistent_notification(
-        title,
-        message,
-        notification_id='payme_insufficient_balance',
-    )
-
-    return send_notification(title, message, data)
+    return send_both(title, message, _BALANCE_DATA, 'payme_insufficient_balance')
 
 
 def notify_2fa_required(
@@ -282,13 +354,7 @@ def notify_2fa_required(
         'tag': f'payme_2fa_{transfer_id}',
         'group': 'payme_2fa',
         'importance': 'high',
-        'actions': [
-            {
-                'action': 'URI',
-                'title': 'Open Wise',
-                'uri': 'wise://',
-            },
-        ],
+        'actions': _OPEN_WISE_ACTIONS,
     }
 
     return send_notification(title, message, data)
@@ -313,26 +379,22 @@ def notify_awaiting_funding(
         'tag': f'payme_fund_{transfer_id}',
         'group': 'payme_funding',
         'importance': 'high',
-        'actions': [
-            {
-                'action': 'URI',
-                'title': 'Open Wise',
-                'uri': 'wise://',
-            },
-        ],
+        'actions': _OPEN_WISE_ACTIONS,
     }
 
     # Also create persistent notification
-    send_persistent_notification(
+    return send_both(
         title,
-        f'{format_currency(amount, currency)} to {recipient}\n'
-        f'Reference: {reference}\n'
-        f'Open Wise app to fund transfer #{transfer_id}',
+        message,
+        data,
         notification_id=f'payme_fund_{transfer_id}',
+        persistent_message=(
+            f'{format_currency(amount, currency)} to {recipient}\n'
+            f'Reference: {reference}\n'
+            f'Open Wise app to fund transfer #{transfer_id}'
+        ),
     )
 
-    return send_notification(title, message, data)
-
 
 def notify_parse_error(
     filename: str,
@@ -342,12 +404,7 @@ def notify_parse_error(
     title = '⚠️ Bill Parse Error'
     message = f'{filename}\n{error[:100]}'
 
-    data = {
-        'tag': 'payme_parse_error',
-        'group': 'payme_errors',
-    }
-
-    return send_notification(title, message, data)
+    return send_notification(title, message, _PARSE_ERROR_DATA)
 
 
 def notify_google_auth_expiring() -> bool:
@@ -355,19 +412,7 @@ def notify_google_auth_expiring() -> bool:
     title = '⚠️ Google Auth Expiring'
     message = 'Google Photos authorization will expire soon. Please re-authenticate.'
 
-    data = {
-        'tag': 'payme_google_auth',
-        'group': 'payme_status',
-        'importance': 'high',
-    }
-
-    send_persistent_notification(
-        title,
-        message,
-        notification_id='payme_google_auth_expiring',
-    )
-
-    return send_notification(title, message, data)
+    return send_both(title, message, _GOOGLE_AUTH_DATA, 'payme_google_auth_expiring')
 
 
 def notify_poll_complete(
@@ -379,28 +424,20 @@ def notify_poll_complete(
     if new_bills == 0 and errors == 0:
         return True  # Don't notify if nothing happened
 
-    title = 'payme Poll Complete'
-    parts = []
-    if new_bills > 0:
-        parts.append(f'{new_bills} new bill(s)')
-    if processed > 0:
-        parts.append(f'{processed} processed')
-    if errors > 0:
-        parts.append(f'{errors} error(s)')
-
-    message = ', '.join(parts)
-
-    data = {
-        'tag': 'payme_poll',
-        'group': 'payme_status',
-        'importance': 'low',
-    }
+    message = ', '.join(part for part in (
+        f'{new_bills} new bill(s)' if new_bills > 0 else None,
+        f'{processed} processed' if processed > 0 else None,
+        f'{errors} error(s)' if errors > 0 else None,
+    ) if part)
 
-    return send_notification(title, message, data)
+    return send_notification('payme Poll Complete', message, _POLL_COMPLETE_DATA)
 
 
 def clear_bill_notification(bill_id: str) -> bool:
     """Clear notification for a specific bill."""
+    if is_quiet():
+        return True
+
     # Send empty notification with same tag to clear
     data = {
         'tag': f'payme_bill_{bill_id}',
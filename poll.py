@@ -6,32 +6,34 @@ This is the only entry point - all other modules are libraries.
 Called by Home Assistant shell_command or pyscript.
 """
 
-import json
 import sys
-import tempfile
 import uuid
-from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime
-from pathlib import Path
+from functools import lru_cache
 from typing import Optional
 
 from config import (
     PAYMENT_HISTORY_FILE,
     CONFIDENCE_THRESHOLD,
+    POLL_GROUP_WORKERS,
+    TRANSFER_CHECK_WORKERS,
     WISE_STATUS_MAP,
     ensure_directories,
+    get_env,
 )
-from storage import load_json, save_json, append_to_list, backup_file
+from storage import load_json, save_json, append_to_list, backup_file, dumps_json
 from formatting import format_currency, format_iban
 from iban import validate_iban, get_iban_info
 from dedup import is_duplicate, record_payment, check_similar
-from girocode import extract_girocode, extract_girocode_from_bytes, check_dependencies as girocode_available
-from gemini import parse_bill_image, parse_bill_images, parse_bill_bytes, quick_extract_bytes, ParsedBill
+from gemini import parse_bill_images_bytes, quick_extract_bytes, ParsedBill
 from google_drive import (
     get_new_photos,
     group_photos_by_time,
     download_photo,
-    mark_photo_processed,
+    download_photos_parallel,
+    mark_photos_processed,
     check_token_health,
 )
 from wise import (
@@ -51,26 +53,148 @@ from notify import (
     notify_parse_error,
     notify_google_auth_expiring,
     notify_poll_complete,
+    warm_up_ha_connection,
     clear_bill_notification,
 )
 from http_client import HttpError
 
-
-# Default structure for payment history file
-_EMPTY_HISTORY = {'pending': [], 'history': []}
+# ijson is optional: lets pending-only reads stop before the history list
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 
 def _load_history_data() -> dict:
     """Load payment history data with default structure."""
-    return load_json(PAYMENT_HISTORY_FILE, _EMPTY_HISTORY)
+    data = load_json(PAYMENT_HISTORY_FILE, {})
+    data.setdefault('pending', [])
+    data.setdefault('history', [])
+    return data
+
+
+def _load_pending_data() -> list[dict]:
+    """
+    Load only the pending bill dicts.
+
+    With ijson the file is streamed and reading stops once 'pending' is
+    parsed; it is written first, so the (much larger) history list is
+    never decoded. Without ijson this is a full load.
+    """
+    if ijson is None:
+        return _load_history_data()['pending']
+
+    try:
+        with open(PAYMENT_HISTORY_FILE, 'rb') as f:
+            for key, value in ijson.kvitems(f, '', use_float=True):
+                if key == 'pending':
+                    return value
+    except (FileNotFoundError, ijson.JSONError):
+        pass
+    return []
+
+
+def _iter_history_entries():
+    """Yield history bill dicts, streamed with ijson when available."""
+    if ijson is None:
+        yield from _load_history_data()['history']
+        return
+
+    try:
+        with open(PAYMENT_HISTORY_FILE, 'rb') as f:
+            yield from ijson.items(f, 'history.item', use_float=True)
+    except (FileNotFoundError, ijson.JSONError):
+        return
 
 
 def _save_history_data(data: dict) -> None:
-    """Save payment history data."""
-    save_json(PAYMENT_HISTORY_FILE, data)
+    """Save payment history data (synced to disk: one write per command)."""
+    save_json(PAYMENT_HISTORY_FILE, data, fsync=True)
+
+
+class HistoryStore:
+    """
+    Payment history loaded once, changed in memory, saved once.
+
+    Use as a context manager. The file is read on the outermost enter and
+    written on the outermost exit, only if something was marked dirty and
+    no exception escaped. Nested `with store:` blocks share the same data,
+    so helpers that take an optional store batch into one write.
 
+    Lookups by bill ID go through a per-collection {id: position} index,
+    built on first use and kept in step by append/pop.
+    """
 
-@dataclass
+    def __init__(self):
+        self.data = None
+        self.dirty = False
+        self._depth = 0
+        self._indexes = {}
+
+    def __enter__(self) -> 'HistoryStore':
+        if self._depth == 0:
+            self.data = _load_history_data()
+            self.dirty = False
+            self._indexes = {}
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self.dirty and exc_type is None:
+            _save_history_data(self.data)
+            self.dirty = False
+
+    @property
+    def pending(self) -> list[dict]:
+        return self.data['pending']
+
+    @property
+    def history(self) -> list[dict]:
+        return self.data['history']
+
+    def _index(self, collection: str) -> dict[str, int]:
+        """Position of each bill ID in 'pending' or 'history' (first wins)."""
+        index = self._indexes.get(collection)
+        if index is None:
+            index = {}
+            for i, entry in enumerate(self.data[collection]):
+                index.setdefault(entry.get('id'), i)
+            self._indexes[collection] = index
+        return index
+
+    def find(self, collection: str, bill_id: str) -> Optional[dict]:
+        """Bill dict with this ID in 'pending' or 'history', or None."""
+        i = self._index(collection).get(bill_id)
+        return None if i is None else self.data[collection][i]
+
+    def append(self, collection: str, entry: dict) -> None:
+        """Append a bill dict to 'pending' or 'history'."""
+        entries = self.data[collection]
+        entries.append(entry)
+        index = self._indexes.get(collection)
+        if index is not None:
+            index.setdefault(entry.get('id'), len(entries) - 1)
+        self.dirty = True
+
+    def pop(self, collection: str, bill_id: str) -> Optional[dict]:
+        """Remove and return the bill dict with this ID, or None."""
+        i = self._index(collection).get(bill_id)
+        if i is None:
+            return None
+        # Later positions shift; rebuild the index on next lookup
+        del self._indexes[collection]
+        self.dirty = True
+        return self.data[collection].pop(i)
+
+    def replace_all(self, collection: str, entries: list[dict]) -> None:
+        """Replace the whole 'pending' or 'history' list."""
+        self.data[collection] = entries
+        self._indexes.pop(collection, None)
+        self.dirty = True
+
+
+@dataclass(slots=True)
 class Bill:
     """Pending bill awaiting approval."""
     id: str
@@ -96,13 +220,24 @@ class Bill:
     low_confidence: bool = False
     error: str = ''
     transfer_id: Optional[int] = None  # Wise transfer ID for tracking
+    ocr_cache_key: str = ''  # Gemini cache entry used; evicted when the bill is reprocessed
 
     def to_dict(self) -> dict:
-        return asdict(self)
+        # Same result as dataclasses.asdict (all fields are flat) without its deep copy
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['photo_ids'] = list(self.photo_ids)
+        return data
 
     @classmethod
     def from_dict(cls, data: dict) -> 'Bill':
-        return cls(**data)
+        # Keys this version doesn't know (written by a newer payme) are dropped
+        if data.keys() <= _BILL_FIELDS:
+            return cls(**data)
+        return cls(**{k: v for k, v in data.items() if k in _BILL_FIELDS})
+
+
+# Bill field names, for filtering stored dicts in Bill.from_dict
+_BILL_FIELDS = frozenset(Bill.__slots__)
 
 
 class PollResult:
@@ -128,59 +263,127 @@ class PollResult:
         }
 
 
+@lru_cache(maxsize=1)
+def _girocode_available() -> bool:
+    """
+    Whether QR decoding works (probed once per process).
+
+    girocode pulls in Pillow, OpenCV/numpy and zbar, which dominate import
+    time, so it is only imported when a poll actually has photos to scan.
+    """
+    from girocode import check_dependencies
+    return check_dependencies()
+
+
+# MIME types sent to Gemini as-is; anything else is sent as image/jpeg
+_GEMINI_MIME_TYPES = {'application/pdf': 'application/pdf', 'image/png': 'image/png'}
+
+
+def _poll_workers() -> int:
+    """Concurrent photo groups per poll (PAYME_POLL_WORKERS, default POLL_GROUP_WORKERS)."""
+    try:
+        return int(get_env('PAYME_POLL_WORKERS', str(POLL_GROUP_WORKERS)))
+    except ValueError:
+        return POLL_GROUP_WORKERS
+
+
 def generate_bill_id() -> str:
     """Generate unique bill ID."""
     return str(uuid.uuid4())[:8]
 
 
-def load_pending_bills() -> list[Bill]:
+def load_pending_bills(store: HistoryStore = None) -> list[Bill]:
     """Load pending bills from storage."""
-    data = _load_history_data()
-    return [Bill.from_dict(b) for b in data.get('pending', [])]
+    if store is None:
+        return [Bill.from_dict(b) for b in _load_pending_data()]
+    with store:
+        return [Bill.from_dict(b) for b in store.pending]
 
 
-def save_pending_bills(bills: list[Bill]) -> None:
+def save_pending_bills(bills: list[Bill], store: HistoryStore = None) -> None:
     """Save pending bills to storage."""
-    data = _load_history_data()
-    data['pending'] = [b.to_dict() for b in bills]
-    _save_history_data(data)
+    with store or HistoryStore() as s:
+        s.replace_all('pending', [b.to_dict() for b in bills])
 
 
-def add_to_history(bill: Bill) -> None:
+def add_to_history(bill: Bill, store: HistoryStore = None) -> None:
     """Add bill to payment history."""
-    data = _load_history_data()
-    data['history'].append(bill.to_dict())
-    _save_history_data(data)
+    with store or HistoryStore() as s:
+        s.append('history', bill.to_dict())
 
 
-def move_to_history(bill: Bill) -> None:
+def move_to_history(bill: Bill, store: HistoryStore = None) -> None:
     """Remove from pending and add to history in one atomic operation."""
-    data = _load_history_data()
-    data['pending'] = [b for b in data['pending'] if b.get('id') != bill.id]
-    data['history'].append(bill.to_dict())
-    _save_history_data(data)
+    with store or HistoryStore() as s:
+        s.pop('pending', bill.id)
+        s.append('history', bill.to_dict())
 
 
-def get_pending_bill(bill_id: str) -> Optional[Bill]:
+def get_pending_bill(bill_id: str, store: HistoryStore = None) -> Optional[Bill]:
     """Get pending bill by ID."""
-    return next((b for b in load_pending_bills() if b.id == bill_id), None)
+    if store is None:
+        entry = next((b for b in _load_pending_data() if b.get('id') == bill_id), None)
+    else:
+        with store:
+            entry = store.find('pending', bill_id)
+    return Bill.from_dict(entry) if entry is not None else None
 
 
-def remove_pending_bill(bill_id: str) -> Optional[Bill]:
+def remove_pending_bill(bill_id: str, store: HistoryStore = None) -> Optional[Bill]:
     """Remove bill from pending list. Returns removed bill or None."""
-    bills = load_pending_bills()
-    for i, bill in enumerate(bills):
-        if bill.id == bill_id:
-            removed = bills.pop(i)
-            save_pending_bills(bills)
-            return removed
+    with store or HistoryStore() as s:
+        entry = s.pop('pending', bill_id)
+    return Bill.from_dict(entry) if entry is not None else None
+
+
+def _download_pages(photos: list[dict], downloaded: dict = None) -> list[tuple[bytes, str]]:
+    """
+    Download photos/PDFs concurrently, kept in memory in page order.
+
+    Pages already in downloaded ({photo_id: bytes}) are not fetched again.
+    Returns (bytes, mime_type) pairs. Types other than PDF/PNG are
+    labelled image/jpeg for Gemini.
+    """
+    downloaded = downloaded or {}
+    missing = [photo for photo in photos if photo['id'] not in downloaded]
+    if missing:
+        fetched = download_photos_parallel(missing, size='large')
+        downloaded = {**downloaded, **dict(zip((p['id'] for p in missing), fetched))}
+    return [
+        (downloaded[photo['id']], _GEMINI_MIME_TYPES.get(photo.get('mimeType'), 'image/jpeg'))
+        for photo in photos
+    ]
+
+
+def _find_girocode(files: list[tuple[bytes, str]]):
+    """First GiroCode found in the image pages (PDFs are skipped), or None."""
+    from girocode import extract_girocode_from_bytes
+
+    for file_data, mime_type in files:
+        if mime_type == 'application/pdf':
+            continue  # Skip PDFs for QR code detection
+        try:
+            girocode_data = extract_girocode_from_bytes(file_data)
+            if girocode_data:
+                return girocode_data
+        except Exception:
+            continue
     return None
 
 
-def process_photo_group(photos: list[dict]) -> Optional[Bill]:
+def process_photo_group(
+    photos: list[dict],
+    created_at: str = None,
+    downloaded: dict = None,
+) -> Optional[Bill]:
     """
     Process a group of photos (potentially multi-page bill).
 
+    created_at is the bill timestamp (ISO); a poll passes one for all its
+    bills, otherwise the current time is used. downloaded maps photo IDs
+    to bytes already fetched (by group_photos_by_content); only pages
+    missing from it are downloaded.
+
     1. Download photos
     2. Try GiroCode detection
     3. Fall back to Gemini OCR
@@ -195,148 +398,125 @@ def process_photo_group(photos: list[dict]) -> Optional[Bill]:
     bill_id = generate_bill_id()
     photo_ids = [p['id'] for p in photos]
 
-    # Download photos/PDFs
+    # Try GiroCode detection first (more reliable). It is usually on the
+    # first page, so scan that alone and skip the other pages on a hit.
+    girocode_data = None
     downloaded_files = []
-    temp_files = []
-    has_pdf = False
+    remaining = photos
+    if _girocode_available():
+        downloaded_files = _download_pages(photos[:1], downloaded)
+        girocode_data = _find_girocode(downloaded_files)
+        remaining = photos[1:]
+
+    if girocode_data is None and remaining:
+        more_files = _download_pages(remaining, downloaded)
+        downloaded_files.extend(more_files)
+        if _girocode_available():
+            girocode_data = _find_girocode(more_files)
+
+    # Initialize optional fields
+    due_date = ''
+    invoice_number = ''
+    description = ''
+    original_text = ''
+    english_translation = ''
+    ocr_cache_key = ''
+
+    if girocode_data:
+        # Use GiroCode data
+        iban = girocode_data.iban
+        recipient = girocode_data.recipient
+        bic = girocode_data.bic
+        amount = girocode_data.amount
+        currency = girocode_data.currency
+        reference = girocode_data.reference or girocode_data.text
+        confidence = 1.0  # GiroCode is deterministic
+        source = 'girocode'
+    else:
+        # Fall back to Gemini OCR
+        parsed = parse_bill_images_bytes(downloaded_files)
+
+        iban = parsed.iban
+        recipient = parsed.recipient
+        bic = parsed.bic
+        amount = parsed.amount
+        currency = parsed.currency
+        reference = parsed.reference
+        confidence = parsed.overall_confidence
+        source = 'gemini'
+        due_date = parsed.due_date
+        invoice_number = parsed.invoice_number
+        description = parsed.description
+        original_text = parsed.original_text
+        english_translation = parsed.english_translation
+        ocr_cache_key = parsed.cache_key
+
+    # Validate IBAN
+    iban_info = get_iban_info(iban)
+    if not iban_info['valid']:
+        # Allow bills without IBAN - mark them clearly
+        recipient = f"{recipient} - NO IBAN"
+        iban = ''
+        bic = ''
+        bank_name = 'No bank details'
+        duplicate_warning = False
+    else:
+        # Get bank name
+        bank_name = iban_info['bank']['name']
+        if not bic:
+            bic = iban_info['bank']['bic']
+
+        # Check for duplicates (only if we have an IBAN)
+        is_dup, dup_info = is_duplicate(iban, amount, reference)
+        duplicate_warning = is_dup
+
+        # Check for similar payments
+        if not duplicate_warning:
+            similar = check_similar(iban, amount)
+            if similar:
+                duplicate_warning = True
+
+    # Create bill
+    bill = Bill(
+        id=bill_id,
+        recipient=recipient,
+        iban=iban,
+        bic=bic,
+        amount=amount,
+        currency=currency,
+        reference=reference,
+        bank_name=bank_name,
+        confidence=confidence,
+        source=source,
+        photo_ids=photo_ids,
+        created_at=created_at or datetime.now().isoformat(),
+        due_date=due_date,
+        invoice_number=invoice_number,
+        description=description,
+        original_text=original_text,
+        english_translation=english_translation,
+        status='pending',
+        duplicate_warning=duplicate_warning,
+        low_confidence=confidence < CONFIDENCE_THRESHOLD,
+        ocr_cache_key=ocr_cache_key,
+    )
 
-    try:
-        for photo in photos:
-            file_data = download_photo(photo, size='large')
-            mime_type = photo.get('mimeType', 'image/jpeg')
-            downloaded_files.append((file_data, mime_type))
-
-            # Determine file suffix based on MIME type
-            if mime_type == 'application/pdf':
-                suffix = '.pdf'
-                has_pdf = True
-            elif mime_type == 'image/png':
-                suffix = '.png'
-            else:
-                suffix = '.jpg'
-
-            # Save to temp file for girocode/gemini
-            temp_file = tempfile.NamedTemporaryFile(
-                suffix=suffix,
-                delete=False,
-            )
-            temp_file.write(file_data)
-            temp_file.close()
-            temp_files.append(Path(temp_file.name))
-
-        # Try GiroCode detection first (more reliable)
-        # Check each file individually - PDFs are skipped but images are still checked
-        girocode_data = None
-        if girocode_available():
-            for i, (file_data, mime_type) in enumerate(downloaded_files):
-                if mime_type == 'application/pdf':
-                    continue  # Skip PDFs for QR code detection
-                try:
-                    girocode_data = extract_girocode_from_bytes(file_data)
-                    if girocode_data:
-                        break
-                except Exception:
-                    continue
+    return bill
 
-        # Initialize optional fields
-        due_date = ''
-        invoice_number = ''
-        description = ''
-        original_text = ''
-        english_translation = ''
-
-        if girocode_data:
-            # Use GiroCode data
-            iban = girocode_data.iban
-            recipient = girocode_data.recipient
-            bic = girocode_data.bic
-            amount = girocode_data.amount
-            currency = girocode_data.currency
-            reference = girocode_data.reference or girocode_data.text
-            confidence = 1.0  # GiroCode is deterministic
-            source = 'girocode'
-        else:
-            # Fall back to Gemini OCR
-            if len(temp_files) == 1:
-                parsed = parse_bill_image(temp_files[0])
-            else:
-                parsed = parse_bill_images(temp_files)
-
-            iban = parsed.iban
-            recipient = parsed.recipient
-            bic = parsed.bic
-            amount = parsed.amount
-            currency = parsed.currency
-            reference = parsed.reference
-            confidence = parsed.overall_confidence
-            source = 'gemini'
-            due_date = parsed.due_date
-            invoice_number = parsed.invoice_number
-            description = parsed.description
-            original_text = parsed.original_text
-            english_translation = parsed.english_translation
-
-        # Validate IBAN
-        iban_info = get_iban_info(iban)
-        if not iban_info['valid']:
-            # Allow bills without IBAN - mark them clearly
-            recipient = f"{recipient} - NO IBAN"
-            iban = ''
-            bic = ''
-            bank_name = 'No bank details'
-            duplicate_warning = False
-        else:
-            # Get bank name
-            bank_name = iban_info['bank']['name']
-            if not bic:
-                bic = iban_info['bank']['bic']
-
-            # Check for duplicates (only if we have an IBAN)
-            is_dup, dup_info = is_duplicate(iban, amount, reference)
-            duplicate_warning = is_dup
-
-            # Check for similar payments
-            if not duplicate_warning:
-                similar = check_similar(iban, amount)
-                if similar:
-                    duplicate_warning = True
-
-        # Create bill
-        bill = Bill(
-            id=bill_id,
-            recipient=recipient,
-            iban=iban,
-            bic=bic,
-            amount=amount,
-            currency=currency,
-            reference=reference,
-            bank_name=bank_name,
-            confidence=confidence,
-            source=source,
-            photo_ids=photo_ids,
-            created_at=datetime.now().isoformat(),
-            due_date=due_date,
-            invoice_number=invoice_number,
-            description=description,
-            original_text=original_text,
-            english_translation=english_translation,
-            status='pending',
-            duplicate_warning=duplicate_warning,
-            low_confidence=confidence < CONFIDENCE_THRESHOLD,
-        )
-
-        return bill
 
-    finally:
-        # Cleanup temp files
-        for temp_file in temp_files:
-            try:
-                temp_file.unlink()
-            except Exception:
-                pass
+def _download_and_key(photo: dict) -> tuple[Optional[bytes], tuple]:
+    """Download a photo and quick-extract its grouping key. Returns (bytes or None, key)."""
+    file_data = None
+    try:
+        file_data = download_photo(photo, size='large')
+        extract = quick_extract_bytes(file_data, photo.get('mimeType', 'image/jpeg'))
+        return file_data, extract.grouping_key()
+    except Exception:
+        # If download or extraction fails, the photo is its own group
+        return file_data, (photo['id'],)
 
 
-def group_photos_by_content(photos: list[dict]) -> list[list[dict]]:
+def group_photos_by_content(photos: list[dict], downloaded: dict = None) -> list[list[dict]]:
     """
     Group photos by their actual content (IBAN, invoice number, amount).
 
@@ -345,6 +525,8 @@ def group_photos_by_content(photos: list[dict]) -> list[list[dict]]:
 
     Args:
         photos: List of photo dicts with id, filename, mimeType
+        downloaded: Optional dict, filled with {photo_id: bytes} for every
+            photo fetched here, so process_photo_group can reuse them
 
     Returns:
         List of photo groups, where each group is a list of related photos
@@ -352,33 +534,17 @@ def group_photos_by_content(photos: list[dict]) -> list[list[dict]]:
     if not photos:
         return []
 
-    # Download and quick-extract each photo
-    photo_data = []
-    for photo in photos:
-        try:
-            file_data = download_photo(photo, size='large')
-            mime_type = photo.get('mimeType', 'image/jpeg')
-            extract = quick_extract_bytes(file_data, mime_type)
-            photo_data.append({
-                'photo': photo,
-                'extract': extract,
-                'key': extract.grouping_key(),
-            })
-        except Exception as e:
-            # If extraction fails, treat as its own group
-            photo_data.append({
-                'photo': photo,
-                'extract': None,
-                'key': (photo['id'],),  # Unique key so it's its own group
-            })
-
-    # Group by matching keys
+    # Download and quick-extract photos concurrently (network-bound)
+    workers = max(1, min(_poll_workers(), len(photos)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(_download_and_key, photos))
+
+    # Group by matching keys, in photo order
     groups_dict = {}
-    for item in photo_data:
-        key = item['key']
-        if key not in groups_dict:
-            groups_dict[key] = []
-        groups_dict[key].append(item['photo'])
+    for photo, (file_data, key) in zip(photos, results):
+        if downloaded is not None and file_data is not None:
+            downloaded[photo['id']] = file_data
+        groups_dict.setdefault(key, []).append(photo)
 
     return list(groups_dict.values())
 
@@ -416,58 +582,68 @@ def poll_for_new_bills() -> PollResult:
     if not new_photos:
         return result
 
+    # Bill notifications follow; open the HA connection while photos are parsed
+    warm_up_ha_connection()
+
     # Group photos by content (IBAN, invoice number, amount)
     # This is smarter than time-based grouping - only groups truly related photos
-    photo_groups = group_photos_by_content(new_photos)
-
-    # Process each group
-    pending_bills = load_pending_bills()
+    # Page bytes fetched while grouping are reused when processing
+    downloaded = {}
+    photo_groups = group_photos_by_content(new_photos, downloaded)
+
+    # Process groups concurrently (downloads, OCR and lookups are network-bound).
+    # Results are handled here on the main thread, in group order.
+    workers = max(1, min(_poll_workers(), len(photo_groups)))
+    created_at = datetime.now().isoformat()  # One timestamp for this poll's bills
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(process_photo_group, group, created_at, downloaded)
+            for group in photo_groups
+        ]
 
-    for group in photo_groups:
-        try:
-            bill = process_photo_group(group)
-
-            if bill:
-                # Add to pending
-                pending_bills.append(bill)
-                result.bills.append(bill)
-                result.bills_created += 1
-
-                # Send notification
-                notify_pending_bill(
-                    bill_id=bill.id,
-                    recipient=bill.recipient,
-                    bank_name=bill.bank_name,
-                    iban=bill.iban,
-                    amount=bill.amount,
-                    currency=bill.currency,
-                    reference=bill.reference,
-                    confidence=bill.confidence,
-                )
-
-            # Mark photos as processed
-            for photo in group:
-                mark_photo_processed(photo['id'])
-
-            result.bills_processed += 1
-
-        except Exception as e:
-            error_msg = str(e)
-            result.add_error(f'Failed to process bill: {error_msg}')
-
-            # Still mark as processed to avoid infinite retries
-            for photo in group:
-                mark_photo_processed(photo['id'])
-
-            # Notify about parse error
-            filename = group[0].get('filename', 'unknown') if group else 'unknown'
-            notify_parse_error(filename, error_msg)
-
-    # Save pending bills
-    save_pending_bills(pending_bills)
-
-    # Backup history file
-    backup_file(PAYMENT_HISTORY_FILE)
+        for group, future in zip(photo_groups, futures):
+            try:
+                bill = future.result()
+
+                if bill:
+                    result.bills.append(bill)
+                    result.bills_created += 1
+
+                    # Send notification
+                    notify_pending_bill(
+                        bill_id=bill.id,
+                        recipient=bill.recipient,
+                        bank_name=bill.bank_name,
+                        iban=bill.iban,
+                        amount=bill.amount,
+                        currency=bill.currency,
+                        reference=bill.reference,
+                        confidence=bill.confidence,
+                    )
+
+                result.bills_processed += 1
+
+            except Exception as e:
+                error_msg = str(e)
+                result.add_error(f'Failed to process bill: {error_msg}')
+
+                # Notify about parse error
+                filename = group[0].get('filename', 'unknown') if group else 'unknown'
+                notify_parse_error(filename, error_msg)
+
+    # Add new bills to pending in one history read/write. Loading here, not
+    # before processing, keeps changes made meanwhile (e.g. approvals).
+    if result.bills:
+        with HistoryStore() as store:
+            for bill in result.bills:
+                store.append('pending', bill.to_dict())
+
+        # Backup history file (only when this poll changed it)
+        backup_file(PAYMENT_HISTORY_FILE)
+
+    # Mark every photo processed in one log append, failed groups included
+    # (avoids infinite retries)
+    mark_photos_processed(photo['id'] for group in photo_groups for photo in group)
 
     # Send poll summary notification
     notify_poll_complete(
@@ -553,8 +729,7 @@ def approve_bill(bill_id: str) -> dict:
             )
 
         # Move to history
-        remove_pending_bill(bill_id)
-        add_to_history(bill)
+        move_to_history(bill)
         clear_bill_notification(bill_id)
 
     else:
@@ -562,13 +737,14 @@ def approve_bill(bill_id: str) -> dict:
         bill.error = payment_result.get('error', 'Unknown error')
         result['error'] = bill.error
 
-        # Keep in pending with error status
-        bills = load_pending_bills()
-        for i, b in enumerate(bills):
-            if b.id == bill_id:
-                bills[i] = bill
-                break
-        save_pending_bills(bills)
+        # Keep in pending with error status; only these two fields changed,
+        # so the stored entry is patched rather than rebuilt from the Bill
+        with HistoryStore() as store:
+            entry = store.find('pending', bill_id)
+            if entry is not None:
+                entry['status'] = bill.status
+                entry['error'] = bill.error
+                store.dirty = True
 
     return result
 
@@ -584,13 +760,14 @@ def reject_bill(bill_id: str) -> dict:
         'error': None,
     }
 
-    bill = remove_pending_bill(bill_id)
-    if not bill:
-        result['error'] = f'Bill not found: {bill_id}'
-        return result
+    with HistoryStore() as store:
+        bill = remove_pending_bill(bill_id, store)
+        if not bill:
+            result['error'] = f'Bill not found: {bill_id}'
+            return result
 
-    bill.status = 'rejected'
-    add_to_history(bill)
+        bill.status = 'rejected'
+        add_to_history(bill, store)
     clear_bill_notification(bill_id)
 
     notify_payment_rejected(
@@ -614,11 +791,11 @@ def override_duplicate(bill_id: str) -> dict:
         'error': None,
     }
 
-    bills = load_pending_bills()
-    for i, bill in enumerate(bills):
-        if bill.id == bill_id:
-            bills[i].duplicate_warning = False
-            save_pending_bills(bills)
+    with HistoryStore() as store:
+        entry = store.find('pending', bill_id)
+        if entry is not None:
+            entry['duplicate_warning'] = False
+            store.dirty = True
             result['success'] = True
             return result
 
@@ -643,14 +820,13 @@ def set_transfer_id(bill_id: str, transfer_id: int) -> dict:
         'transfer_id': transfer_id,
     }
 
-    data = _load_history_data()
-
     # Check both history and pending in a single load
-    for collection in ('history', 'pending'):
-        for i, entry in enumerate(data.get(collection, [])):
-            if entry.get('id') == bill_id:
-                data[collection][i]['transfer_id'] = transfer_id
-                _save_history_data(data)
+    with HistoryStore() as store:
+        for collection in ('history', 'pending'):
+            entry = store.find(collection, bill_id)
+            if entry is not None:
+                entry['transfer_id'] = transfer_id
+                store.dirty = True
                 result['success'] = True
                 return result
 
@@ -684,38 +860,26 @@ def set_bill_status(bill_id: str, status: str) -> dict:
         result['error'] = f'Invalid status: {status}. Valid: {", ".join(valid_statuses)}'
         return result
 
-    # Check pending bills first
-    bills = load_pending_bills()
-    for i, bill in enumerate(bills):
-        if bill.id == bill_id:
-            old_status = bills[i].status
-            bills[i].status = status
-
-            # If marking as paid, set paid_at timestamp
-            if status == 'paid' and not bills[i].paid_at:
-                bills[i].paid_at = datetime.now().isoformat()
+    with HistoryStore() as store:
+        # Check pending bills first, then history
+        for collection in ('pending', 'history'):
+            entry = store.find(collection, bill_id)
+            if entry is None:
+                continue
 
-            save_pending_bills(bills)
-
-            # If marked as paid/rejected/failed, move to history
-            if status in ('paid', 'rejected', 'failed'):
-                move_to_history(bills[i])
-
-            result['success'] = True
-            result['old_status'] = old_status
-            return result
-
-    # Check history if not found in pending
-    data = _load_history_data()
-    for i, entry in enumerate(data.get('history', [])):
-        if entry.get('id') == bill_id:
             old_status = entry.get('status')
-            data['history'][i]['status'] = status
+            entry['status'] = status
 
+            # If marking as paid, set paid_at timestamp
             if status == 'paid' and not entry.get('paid_at'):
-                data['history'][i]['paid_at'] = datetime.now().isoformat()
+                entry['paid_at'] = datetime.now().isoformat()
 
-            _save_history_data(data)
+            store.dirty = True
+
+            # If a pending bill is marked paid/rejected/failed, move it to history
+            # (the stored dict moves as-is; no Bill round-trip needed)
+            if collection == 'pending' and status in ('paid', 'rejected', 'failed'):
+                store.append('history', store.pop('pending', bill_id))
 
             result['success'] = True
             result['old_status'] = old_status
@@ -747,6 +911,17 @@ def check_2fa_transfers() -> list[dict]:
         return []
 
 
+def _fetch_transfer(bill: dict) -> tuple:
+    """Fetch a bill's Wise transfer. Returns (transfer, None) or (None, error message)."""
+    transfer_id = bill['transfer_id']
+    try:
+        return get_transfer(transfer_id), None
+    except HttpError as e:
+        return None, f"Failed to check transfer {transfer_id}: {str(e)}"
+    except Exception as e:
+        return None, f"Error checking transfer {transfer_id}: {str(e)}"
+
+
 def check_transfer_statuses() -> dict:
     """
     Check Wise transfer statuses and update bill statuses accordingly.
@@ -764,35 +939,32 @@ def check_transfer_statuses() -> dict:
         'errors': [],
     }
 
-    data = _load_history_data()
-    history = data.get('history', [])
-    modified = False
-
-    for i, bill in enumerate(history):
-        transfer_id = bill.get('transfer_id')
-        current_status = bill.get('status', '')
+    # Stream history for bills still in transit; the full document is only
+    # loaded (and rewritten) if a status actually changed
+    in_transit = [
+        bill for bill in _iter_history_entries()
+        if bill.get('transfer_id')
+        and bill.get('status', '') in ('awaiting_funding', 'awaiting_2fa', 'processing')
+    ]
+    changes = {}  # bill id -> new status
 
-        # Only check bills with transfer_id that are in transitional states
-        if not transfer_id:
-            continue
-        if current_status not in ('awaiting_funding', 'awaiting_2fa', 'processing'):
-            continue
+    # Fetch transfers concurrently; results are consumed in bill order
+    workers = max(1, min(TRANSFER_CHECK_WORKERS, len(in_transit)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fetched = pool.map(_fetch_transfer, in_transit)
 
-        result['checked'] += 1
+        for bill, (transfer, error) in zip(in_transit, fetched):
+            result['checked'] += 1
+            if error:
+                result['errors'].append(error)
+                continue
 
-        try:
-            # Get transfer status from Wise
-            transfer = get_transfer(transfer_id)
+            current_status = bill.get('status', '')
             wise_status = transfer.status
             new_status = WISE_STATUS_MAP.get(wise_status, current_status)
 
             if new_status != current_status:
-                history[i]['status'] = new_status
-
-                # Set paid_at if now paid
-                if new_status == 'paid' and not bill.get('paid_at'):
-                    history[i]['paid_at'] = datetime.now().isoformat()
-
+                changes[bill.get('id')] = new_status
                 result['updated'] += 1
                 result['bills'].append({
                     'id': bill.get('id'),
@@ -801,16 +973,20 @@ def check_transfer_statuses() -> dict:
                     'new_status': new_status,
                     'wise_status': wise_status,
                 })
-                modified = True
 
-        except HttpError as e:
-            result['errors'].append(f"Failed to check transfer {transfer_id}: {str(e)}")
-        except Exception as e:
-            result['errors'].append(f"Error checking transfer {transfer_id}: {str(e)}")
+    if changes:
+        now_iso = datetime.now().isoformat()  # paid_at for every bill updated in this check
+        with HistoryStore() as store:
+            for bill_id, new_status in changes.items():
+                entry = store.find('history', bill_id)
+                if entry is None:
+                    continue
+                entry['status'] = new_status
 
-    if modified:
-        data['history'] = history
-        _save_history_data(data)
+                # Set paid_at if now paid
+                if new_status == 'paid' and not entry.get('paid_at'):
+                    entry['paid_at'] = now_iso
+                store.dirty = True
 
     return result
 
@@ -856,6 +1032,12 @@ def get_status() -> dict:
     return status
 
 
+def _print_json(data) -> None:
+    """Write a command result to stdout as indented JSON (orjson if available)."""
+    sys.stdout.flush()  # Keep anything already printed ahead of the result
+    sys.stdout.buffer.write(dumps_json(data))
+
+
 def main():
     """Command-line interface."""
     import argparse
@@ -866,6 +1048,9 @@ def main():
     # Poll command
     subparsers.add_parser('poll', help='Poll for new bills')
 
+    # Offline self-test
+    subparsers.add_parser('self-test', help='Run offline self-tests')
+
     # Status command
     subparsers.add_parser('status', help='Get current status')
 
@@ -901,27 +1086,27 @@ def main():
 
     if args.command == 'poll':
         result = poll_for_new_bills()
-        print(json.dumps(result.to_dict(), indent=2))
+        _print_json(result.to_dict())
 
     elif args.command == 'status':
         status = get_status()
-        print(json.dumps(status, indent=2))
+        _print_json(status)
 
     elif args.command == 'approve':
         result = approve_bill(args.bill_id)
-        print(json.dumps(result, indent=2))
+        _print_json(result)
 
     elif args.command == 'reject':
         result = reject_bill(args.bill_id)
-        print(json.dumps(result, indent=2))
+        _print_json(result)
 
     elif args.command == 'override-duplicate':
         result = override_duplicate(args.bill_id)
-        print(json.dumps(result, indent=2))
+        _print_json(result)
 
     elif args.command == 'set-status':
         result = set_bill_status(args.bill_id, args.status)
-        print(json.dumps(result, indent=2))
+        _print_json(result)
 
     elif args.command == 'list':
         bills = load_pending_bills()
@@ -936,15 +1121,74 @@ def main():
 
     elif args.command == 'check-transfers':
         result = check_transfer_statuses()
-        print(json.dumps(result, indent=2))
+        _print_json(result)
 
     elif args.command == 'set-transfer-id':
         result = set_transfer_id(args.bill_id, args.transfer_id)
-        print(json.dumps(result, indent=2))
+        _print_json(result)
+
+    elif args.command == 'self-test':
+        _self_test()
 
     else:
         parser.print_help()
 
 
+def _self_test():
+    """Offline checks of photo group processing (downloads and Gemini stubbed)."""
+    global download_photos_parallel, parse_bill_images_bytes, _girocode_available
+
+    print('Testing poll.py')
+    print('=' * 40)
+
+    fetched = []
+
+    def fake_download(photos, size='full'):
+        fetched.extend(p['id'] for p in photos)
+        return [p['id'].encode() for p in photos]
+
+    seen_pages = []
+
+    def fake_parse(files, api_key=None):
+        seen_pages.append([data for data, _ in files])
+        return ParsedBill(recipient='Test GmbH', amount=12.5, overall_confidence=0.95)
+
+    saved = download_photos_parallel, parse_bill_images_bytes, _girocode_available
+    download_photos_parallel = fake_download
+    parse_bill_images_bytes = fake_parse
+    _girocode_available = lambda: False
+    try:
+        photos = [
+            {'id': 'p1', 'mimeType': 'image/jpeg'},
+            {'id': 'p2', 'mimeType': 'application/pdf'},
+        ]
+
+        # Nothing pre-downloaded: every page is fetched
+        bill = process_photo_group(photos, created_at='2024-01-15T10:00:00')
+        assert fetched == ['p1', 'p2'], f'Expected both pages fetched, got {fetched}'
+        assert seen_pages[-1] == [b'p1', b'p2'], 'Pages should reach Gemini in order'
+        assert bill.photo_ids == ['p1', 'p2'] and bill.amount == 12.5
+        assert bill.created_at == '2024-01-15T10:00:00'
+        print('[OK] Group with no pre-downloaded pages')
+
+        # Partially pre-downloaded (a grouping download failed): only the gap is fetched
+        fetched.clear()
+        bill = process_photo_group(photos, downloaded={'p1': b'cached'})
+        assert fetched == ['p2'], f'Expected only p2 fetched, got {fetched}'
+        assert seen_pages[-1] == [b'cached', b'p2'], 'Cached bytes should be reused'
+        print('[OK] Group with partially pre-downloaded pages')
+
+        # Fully pre-downloaded: no downloads at all
+        fetched.clear()
+        process_photo_group(photos, downloaded={'p1': b'a', 'p2': b'b'})
+        assert fetched == [], f'Expected no downloads, got {fetched}'
+        print('[OK] Group with all pages pre-downloaded')
+    finally:
+        download_photos_parallel, parse_bill_images_bytes, _girocode_available = saved
+
+    print('=' * 40)
+    print('All tests passed')
+
+
 if __name__ == '__main__':
     main()
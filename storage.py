@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-"""Storage utilities for payme. All JSON file operations."""
+"""Storage utilities for payme. JSON and line-log file operations."""
 
 import json
 import os
@@ -7,36 +7,208 @@ import shutil
 from datetime import datetime, timedelta
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from typing import Any
+from typing import Any, Iterable, Optional
 
-from config import BACKUP_PATH, BACKUP_RETENTION_DAYS
+from config import (
+    BACKUP_PATH,
+    BACKUP_RETENTION_DAYS,
+    PROCESSED_PHOTOS_FILE,
+    PROCESSED_PHOTOS_LOG_FILE,
+)
+
+# orjson is optional: much faster parse/serialize, same on-disk format
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_loads(raw: bytes) -> Any:
+    """Parse JSON bytes with orjson if available, else stdlib json."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def dumps_json(data: Any) -> bytes:
+    """Serialize to indented UTF-8 JSON bytes (with trailing newline), orjson if available."""
+    if orjson is not None:
+        return orjson.dumps(
+            data,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE,
+        )
+    return (json.dumps(data, indent=2, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+# Parsed JSON by path, with the file mtime it was read at (see load_json_cached)
+_JSON_CACHE: dict[Path, tuple[int, Any]] = {}
+
+# Processed photo IDs with the log mtime they were read at (see processed_photo_ids)
+_PROCESSED_PHOTOS: dict[str, Any] = {'ids': None, 'mtime': None}
 
 
 def load_json(path: Path, default: Any = None) -> Any:
     """Load JSON file, return default if not found or invalid."""
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(path, 'rb') as f:
+            return _json_loads(f.read())
     except (FileNotFoundError, json.JSONDecodeError):
         return default if default is not None else {}
 
 
-def save_json(path: Path, data: Any) -> None:
-    """Save data to JSON file atomically."""
+def load_json_cached(path: Path, default: Any = None) -> Any:
+    """
+    Load JSON file, reusing the parsed data while the file is unchanged.
+
+    The file is re-parsed only when its mtime changes. The returned data is
+    shared between calls: callers must not mutate it.
+    """
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        _JSON_CACHE.pop(path, None)
+        return default if default is not None else {}
+
+    cached = _JSON_CACHE.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    data = load_json(path, default)
+    _JSON_CACHE[path] = (mtime, data)
+    return data
+
+
+def peek_json_cached(path: Path) -> Any:
+    """Data load_json_cached holds for path if the file is unchanged, else None (never parses)."""
+    path = Path(path)
+    cached = _JSON_CACHE.get(path)
+    if cached is None:
+        return None
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return cached[1] if cached[0] == mtime else None
+
+
+def save_json(path: Path, data: Any, fsync: bool = False) -> None:
+    """
+    Save data to JSON file atomically.
+
+    With fsync=True the new contents are flushed to disk before the rename,
+    so a power cut leaves either the old file or the new one.
+    """
     path.parent.mkdir(parents=True, exist_ok=True)
     
     with NamedTemporaryFile(
-        mode='w',
+        mode='wb',
         suffix='.json',
         dir=path.parent,
         delete=False,
-        encoding='utf-8'
     ) as tmp:
-        json.dump(data, tmp, indent=2, ensure_ascii=False)
+        tmp.write(dumps_json(data))
+        if fsync:
+            tmp.flush()
+            os.fsync(tmp.fileno())
         tmp_path = tmp.name
     
     os.replace(tmp_path, path)
 
+    # Keep load_json_cached in step without re-parsing what we just wrote
+    if Path(path) in _JSON_CACHE:
+        _JSON_CACHE[Path(path)] = (os.stat(path).st_mtime_ns, data)
+
+
+def load_lines(path: Path) -> list[str]:
+    """Load newline-delimited file as list of non-empty lines. Returns [] if not found."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line for line in f.read().splitlines() if line]
+    except FileNotFoundError:
+        return []
+
+
+def append_lines(path: Path, lines: Iterable[str]) -> None:
+    """Append lines to newline-delimited file (no rewrite of existing content)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(path, 'a', encoding='utf-8') as f:
+        f.writelines(f'{line}\n' for line in lines)
+
+
+def save_lines(path: Path, lines: Iterable[str]) -> None:
+    """Save lines to newline-delimited file atomically."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    with NamedTemporaryFile(
+        mode='w',
+        suffix='.txt',
+        dir=path.parent,
+        delete=False,
+        encoding='utf-8'
+    ) as tmp:
+        tmp.writelines(f'{line}\n' for line in lines)
+        tmp_path = tmp.name
+
+    os.replace(tmp_path, path)
+
+
+def _log_mtime() -> Optional[int]:
+    """Processed photo log mtime in ns, or None if the log is missing."""
+    try:
+        return PROCESSED_PHOTOS_LOG_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def load_processed_photo_log() -> list[str]:
+    """Read processed photo IDs in log order, migrating legacy processed_photos.json on first use."""
+    if PROCESSED_PHOTOS_LOG_FILE.exists():
+        return load_lines(PROCESSED_PHOTOS_LOG_FILE)
+
+    legacy = load_json(PROCESSED_PHOTOS_FILE, {'processed': []}).get('processed', [])
+    if legacy:
+        save_lines(PROCESSED_PHOTOS_LOG_FILE, legacy)
+    return legacy
+
+
+def processed_photo_ids() -> set[str]:
+    """
+    Processed photo IDs (shared by the Drive and Photos backends).
+
+    Parsed once and re-read only when the log changes on disk. The
+    returned set is shared: callers must not mutate it.
+    """
+    mtime = _log_mtime()
+    if _PROCESSED_PHOTOS['ids'] is None or mtime != _PROCESSED_PHOTOS['mtime']:
+        _PROCESSED_PHOTOS['ids'] = set(load_processed_photo_log())
+        _PROCESSED_PHOTOS['mtime'] = _log_mtime()
+    return _PROCESSED_PHOTOS['ids']
+
+
+def add_processed_photo_ids(photo_ids: Iterable[str]) -> None:
+    """Append the IDs not yet in the processed log, in one write."""
+    processed = processed_photo_ids()
+    new_ids = [pid for pid in dict.fromkeys(photo_ids) if pid not in processed]
+    if new_ids:
+        append_lines(PROCESSED_PHOTOS_LOG_FILE, new_ids)
+        # Keep the in-memory set in step without re-reading the log
+        processed.update(new_ids)
+        _PROCESSED_PHOTOS['mtime'] = _log_mtime()
+
+
+def remove_processed_photo_ids(photo_ids: Iterable[str]) -> int:
+    """Drop IDs from the processed log (log order kept). Returns number removed."""
+    processed = load_processed_photo_log()
+    removed = set(photo_ids).intersection(processed)
+
+    if removed:
+        save_lines(PROCESSED_PHOTOS_LOG_FILE, [pid for pid in processed if pid not in removed])
+        _PROCESSED_PHOTOS['ids'] = None
+
+    return len(removed)
+
 
 def append_to_list(path: Path, item: Any) -> None:
     """Append item to JSON list file."""
@@ -149,6 +321,18 @@ if __name__ == '__main__':
     assert loaded == {'b': 2}, 'Remove from dict failed'
     print('✓ remove_from_dict')
     
+    # Test line logs
+    lines_path = Path('/tmp/payme_lines_test.txt')
+    delete_file(lines_path)
+    assert load_lines(lines_path) == [], 'Missing line file should be empty'
+    append_lines(lines_path, ['a', 'b'])
+    append_lines(lines_path, ['c'])
+    assert load_lines(lines_path) == ['a', 'b', 'c'], 'Append lines failed'
+    save_lines(lines_path, ['c'])
+    assert load_lines(lines_path) == ['c'], 'Save lines failed'
+    delete_file(lines_path)
+    print('✓ load_lines / append_lines / save_lines')
+
     # Test backup
     backup_path = backup_file(test_path)
     assert backup_path and backup_path.exists(), 'Backup failed'
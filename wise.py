@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Wise API client for payme."""
 
+import threading
 import time
 import uuid
 from dataclasses import dataclass
@@ -19,18 +20,21 @@ from http_client import get_json, post_json, HttpError
 
 # Track last API call for rate limiting
 _last_api_call: Optional[datetime] = None
+_rate_limit_lock = threading.Lock()
 
 
 def _rate_limit() -> None:
-    """Enforce delay between API calls."""
+    """Enforce delay between API calls (safe to call from several threads)."""
     global _last_api_call
 
-    if _last_api_call is not None:
-        elapsed = (datetime.now() - _last_api_call).total_seconds()
-        if elapsed < WISE_API_DELAY_SECONDS:
-            time.sleep(WISE_API_DELAY_SECONDS - elapsed)
+    # Only the spacing is serialized; the requests themselves still overlap
+    with _rate_limit_lock:
+        if _last_api_call is not None:
+            elapsed = (datetime.now() - _last_api_call).total_seconds()
+            if elapsed < WISE_API_DELAY_SECONDS:
+                time.sleep(WISE_API_DELAY_SECONDS - elapsed)
 
-    _last_api_call = datetime.now()
+        _last_api_call = datetime.now()
 
 
 def get_api_token() -> str: